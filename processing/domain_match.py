@@ -1,68 +1,622 @@
 import pandas as pd
+import numpy as np
+import os
 import re
+import glob
+import math
+import sqlite3
+import hashlib
+from array import array
+from collections import Counter
+from functools import lru_cache
+import pyarrow as pa
+import pyarrow.parquet as pq
 from rapidfuzz import fuzz, process
+from public_suffix import domain_roots
+
+# -------------------
+# CONFIG
+# -------------------
+ABR_PATH = "/path/tocsv"   # .parquet or .csv
+CC_PATH = "path/tocsv"     # .parquet or .csv
+OUTPUT_PATH = "domain_to_abn_matches.csv"
+ABR_NROWS = 1_000_000      # CSV only: cap rows while testing
+NAME_CACHE_PATH = "abr_names_norm.parquet"  # normalized ABR names from the last run (None to disable)
+MATCH_THRESHOLD = 90
+NGRAM_SIZE = 3        # character n-gram length used for candidate generation
+TOP_K = 50            # candidates scored with RapidFuzz per domain root
+MAX_POSTING = 50000   # n-grams shared by more names than this are too common to block on
+MATCH_MODE = "index"  # "index" (n-gram blocking) or "cdist" (batched matrix scoring)
+SPLIT_ROOTS = True    # segment concatenated roots into ABR words (smithplumbing -> smith plumbing)
+MAX_WORD_LEN = 20     # longest word tried when segmenting a root
+MIN_WORD_LEN = 3      # shorter name tokens are not used to split roots
+DOMAIN_BLOCK_SIZE = 1000   # cdist mode: domain roots per block
+NAME_BLOCK_SIZE = 20000    # cdist mode: ABR names per block (float32 -> ~80 MB per block matrix)
+INCREMENTAL = False        # rematch only what changed since the last run, output only changed rows
+ABR_DELTA_PATH = None      # incremental: new/updated ABR records from abr_bulk_process
+STATE_DB = "domain_match_state.sqlite"   # incremental: page digests and per-root matches
+CHANGED_PAGES_PATH = "domains_delta.csv"  # incremental: new or changed pages (domain, abn, url, meta) for load_postgres
+# -------------------
+
+NON_ALNUM = re.compile(r'[^a-z0-9 ]')
+STOPWORDS = re.compile(r'\b(pty|ltd|limited|australia|australian|company|inc|co)\b')
+WHITESPACE = re.compile(r'\s+')
+TRADING_NAME_SEP = "; "   # abr_bulk_process joins an entity's trading names with this
+
 
 def normalize_name(name):
     if not isinstance(name, str):
         return ""
     name = name.lower()
-    name = re.sub(r'[^a-z0-9 ]', ' ', name)
-    name = re.sub(r'\b(pty|ltd|limited|australia|australian|company|inc|co)\b', '', name)
-    name = re.sub(r'\s+', ' ', name).strip()
+    name = NON_ALNUM.sub(' ', name)
+    name = STOPWORDS.sub('', name)
+    name = WHITESPACE.sub(' ', name).strip()
     return name
 
-def domain_root(domain):
-    domain = domain.lower()
-    domain = re.sub(r'^www\.', '', domain)
-    parts = domain.split('.')
-    if len(parts) > 2:
-        return parts[-3]  # take root part before .com.au
-    return parts[-2]
-
-# --- load data ---
-abr = pd.read_csv("/path/tocsv" , low_memory=False ,   nrows=1_000_000 )
-cc = pd.read_csv("path/tocsv")
-
-# normalize names
-abr["Entity_Name_norm"] = abr["Entity_Name"].apply(normalize_name)
-abr["Trading_Names_norm"] = abr["Trading_Names"].apply(normalize_name)
-abr["all_names_norm"] = abr["Entity_Name_norm"] + " " + abr["Trading_Names_norm"]
-
-cc["domain_root"] = cc["domain"].apply(domain_root)
-cc["title_norm"] = cc["meta"].str.extract(r"'title': '([^']+)'")[0].fillna("").apply(normalize_name)
-
-matches = []
-for _, cc_row in cc.iterrows():
-    candidate = cc_row["domain_root"]
-
-    match = process.extractOne(
-        candidate,
-        abr["all_names_norm"],
-        scorer=fuzz.token_sort_ratio
+
+def normalize_names(names):
+    """
+    Vectorized normalize_name over a Series. Each distinct value is
+    normalized once with pandas .str operations and broadcast back.
+    """
+    names = pd.Series(names)
+    codes, uniques = pd.factorize(names)
+    norm = (
+        pd.Series(uniques, dtype=object)
+        .str.lower()
+        .str.replace(NON_ALNUM, ' ', regex=True)
+        .str.replace(STOPWORDS, '', regex=True)
+        .str.replace(WHITESPACE, ' ', regex=True)
+        .str.strip()
+        .fillna("")  # non-strings, like normalize_name
+        .to_numpy(dtype=object)
     )
+    # factorize gives missing values code -1, which picks the trailing ""
+    return pd.Series(np.append(norm, "")[codes], index=names.index)
+
+
+def normalize_name_lists(values, sep=TRADING_NAME_SEP):
+    """
+    Normalize each name of sep-joined name lists (the ABR Trading_Names
+    column), keeping them sep-joined and dropping names that normalize away.
+    """
+    values = pd.Series(values)
+    names = values.str.split(sep).explode()
+    norm = normalize_names(names)
+    norm = norm[norm != ""]
+    return norm.groupby(level=0).agg(sep.join).reindex(values.index, fill_value="")
+
+
+# ---------------------------
+# Normalized Name Cache
+# ---------------------------
+NAME_COLUMNS = ["Entity_Name", "Trading_Names"]
+NORM_COLUMNS = [col + "_norm" for col in NAME_COLUMNS]
+# Changing the normalization rules invalidates every cached name
+NORMALIZER_KEY = hashlib.sha256(
+    "|".join([p.pattern for p in (NON_ALNUM, STOPWORDS, WHITESPACE)] + [TRADING_NAME_SEP]).encode()
+).hexdigest()
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """sha256 of a file's bytes, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def normalize_abr_names(abr, source_key, cache_path=NAME_CACHE_PATH):
+    """
+    Return Entity_Name_norm / Trading_Names_norm (still TRADING_NAME_SEP
+    joined, one normalized name each) for abr, reusing the
+    normalized names saved by the previous run:
+      - same source_key (hash of the ABR input): load the cache as is;
+      - otherwise only rows whose names changed (by row hash) are
+        normalized again, and the cache is rewritten.
+    """
+    meta = {}
+    if cache_path and os.path.exists(cache_path):
+        meta = pq.read_schema(cache_path).metadata or {}
+    cache_valid = meta.get(b"normalizer") == NORMALIZER_KEY.encode()
+
+    if cache_valid and meta.get(b"source_key") == source_key.encode():
+        cached = pd.read_parquet(cache_path, columns=NORM_COLUMNS)
+        if len(cached) == len(abr):
+            print(f"Normalized names up to date in {cache_path}")
+            return cached.set_axis(abr.index)
+
+    row_hash = pd.util.hash_pandas_object(abr[NAME_COLUMNS], index=False).to_numpy()
+    if cache_valid:
+        cached = (
+            pd.read_parquet(cache_path, columns=["row_hash"] + NORM_COLUMNS)
+            .drop_duplicates("row_hash")
+            .set_index("row_hash")
+        )
+        norm = cached.reindex(row_hash).set_axis(abr.index)
+    else:
+        norm = pd.DataFrame(index=abr.index, columns=NORM_COLUMNS, dtype=object)
+
+    stale = norm[NORM_COLUMNS[0]].isna().to_numpy()
+    norm.loc[stale, "Entity_Name_norm"] = normalize_names(abr.loc[stale, "Entity_Name"]).to_numpy()
+    norm.loc[stale, "Trading_Names_norm"] = normalize_name_lists(abr.loc[stale, "Trading_Names"]).to_numpy()
+    print(f"Normalized {stale.sum()} new or changed of {len(abr)} ABR rows")
+
+    if cache_path:
+        table = pa.Table.from_pandas(norm.assign(row_hash=row_hash), preserve_index=False)
+        table = table.replace_schema_metadata({"source_key": source_key, "normalizer": NORMALIZER_KEY})
+        pq.write_table(table, cache_path + ".tmp")
+        os.replace(cache_path + ".tmp", cache_path)
+    return norm
+
+
+# ---------------------------
+# Domain Root Segmentation
+# ---------------------------
+class WordSegmenter:
+    """
+    Split a concatenated domain root into the words ABR names use, by
+    minimum total cost under a unigram model of the name tokens:
+    "smithplumbing" -> "smith plumbing". A root is only split when known
+    words cover all of it; anything else (brand names like "bunnings")
+    comes back unchanged rather than shredded into short tokens.
+    """
+
+    def __init__(self, names, max_word_len=MAX_WORD_LEN, min_word_len=MIN_WORD_LEN):
+        counts = Counter(token for name in names for token in name.split())
+        total = sum(counts.values()) or 1
+        self.max_word_len = max_word_len
+        # Initials and short tokens ("j", "r", "in") would let almost any root be covered
+        self.cost = {
+            word: math.log(total / count) for word, count in counts.items()
+            if len(word) >= min_word_len
+        }
+        self.split = lru_cache(maxsize=None)(self._split)
+
+    def _split(self, root):
+        # best[i] = (cost, start of last word) of the cheapest cover of root[:i] by known words
+        best = [(0.0, 0)] + [None] * len(root)
+        for end in range(1, len(root) + 1):
+            candidates = []
+            for start in range(max(0, end - self.max_word_len), end):
+                cost = self.cost.get(root[start:end])
+                if cost is not None and best[start] is not None:
+                    candidates.append((best[start][0] + cost, start))
+            best[end] = min(candidates) if candidates else None
+
+        if not root or best[-1] is None:
+            return root
+
+        words = []
+        end = len(root)
+        while end > 0:
+            start = best[end][1]
+            words.append(root[start:end])
+            end = start
+        return " ".join(reversed(words))
+
+
+# ---------------------------
+# Candidate Generation
+# ---------------------------
+def char_ngrams(text, n=NGRAM_SIZE):
+    """
+    Return the set of character n-grams of text with spaces removed,
+    so "smith plumbing" and the domain root "smithplumbing" share grams.
+    """
+    text = text.replace(" ", "")
+    if len(text) < n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class NgramIndex:
+    """
+    Inverted index of character n-gram -> positions of the names containing it.
+    Postings are kept in CSR form (one offsets array, one positions array)
+    so the index over ~10M names stays a few flat numpy arrays.
+    """
+
+    def __init__(self, names, n=NGRAM_SIZE, max_posting=MAX_POSTING):
+        self.n = n
+        vocab = {}
+        gram_ids = array("I")
+        positions = array("I")
+        sizes = array("I")
+        for pos, name in enumerate(names):
+            grams = char_ngrams(name, n)
+            sizes.append(len(grams))
+            for gram in grams:
+                gram_ids.append(vocab.setdefault(gram, len(vocab)))
+                positions.append(pos)
+
+        gram_ids = np.frombuffer(gram_ids, dtype=np.uint32)
+        order = np.argsort(gram_ids, kind="stable")
+        counts = np.bincount(gram_ids, minlength=len(vocab))
+
+        self.vocab = vocab
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+        self.positions = np.frombuffer(positions, dtype=np.uint32)[order]
+        self.sizes = np.frombuffer(sizes, dtype=np.uint32)
+        # Drop very common grams from blocking, they match almost everything
+        self.blocked = counts > max_posting
+
+    def candidates(self, query, top_k=TOP_K):
+        """
+        Return positions of the top_k names most similar to query, ranked by
+        the Jaccard overlap of their n-gram sets. Raw shared-gram counts
+        would favour long names that merely contain the query.
+        """
+        query_grams = char_ngrams(query, self.n)
+        postings = []
+        for gram in query_grams:
+            gram_id = self.vocab.get(gram)
+            if gram_id is None or self.blocked[gram_id]:
+                continue
+            postings.append(self.positions[self.offsets[gram_id]:self.offsets[gram_id + 1]])
+
+        if not postings:
+            return np.empty(0, dtype=np.uint32)
+
+        positions, counts = np.unique(np.concatenate(postings), return_counts=True)
+        if len(positions) > top_k:
+            union = len(query_grams) + self.sizes[positions].astype(np.int64) - counts
+            positions = positions[np.argpartition(counts / union, -top_k)[-top_k:]]
+        return positions
+
+
+def match_candidate(candidate, names, index, top_k=TOP_K):
+    """
+    Score candidate against its top_k blocked names only.
+    Returns (tied_positions, score) for every name sharing the best score,
+    or None when no name shares an n-gram.
+    """
+    positions = index.candidates(candidate, top_k)
+    if len(positions) == 0:
+        return None
+
+    scores = process.cdist(
+        [candidate],
+        [names[pos] for pos in positions],
+        scorer=fuzz.token_sort_ratio,
+        dtype=np.float32
+    )[0]
+    best = scores.max()
+    return sorted(positions[scores == best].tolist()), float(best)
+
+
+# ---------------------------
+# Name Table
+# ---------------------------
+def explode_names(abr):
+    """
+    One row per (ABN, name, name_type) from the normalized ABR columns:
+    the entity name plus each trading name, with "row" pointing back to the
+    ABR row. Empty names and a trading name repeating the entity name are dropped.
+    """
+    entity = pd.DataFrame({
+        "row": np.arange(len(abr)),
+        "name": abr["Entity_Name_norm"].to_numpy(),
+        "name_type": "entity",
+    })
+    trading = (
+        pd.Series(abr["Trading_Names_norm"].to_numpy())
+        .str.split(TRADING_NAME_SEP)
+        .explode()
+    )
+    trading = pd.DataFrame({"row": trading.index, "name": trading.to_numpy(), "name_type": "trading"})
+
+    names = pd.concat([entity, trading], ignore_index=True)
+    names = names[names["name"].fillna("") != ""]
+    names = names.sort_values("row", kind="stable").drop_duplicates(["row", "name"])
+    names.insert(1, "abn", abr["ABN"].to_numpy()[names["row"]])
+    return names.reset_index(drop=True)
+
+
+class NameOwners:
+    """
+    Distinct normalized names and, for each, the name table rows holding it,
+    so a name shared by many ABNs is indexed and scored once.
+    """
+
+    def __init__(self, name_table):
+        codes, uniques = pd.factorize(name_table["name"])
+        self.names = list(uniques)
+        self.order = np.argsort(codes, kind="stable")
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(uniques)))))
+
+    def owners(self, positions):
+        """Name table rows holding any of the given distinct-name positions."""
+        return np.concatenate([self.order[self.offsets[p]:self.offsets[p + 1]] for p in positions])
 
-    if match:
-        best_abn, score, _ = match
-        if score >= 90:
-            abn_row = abr.loc[abr["all_names_norm"] == best_abn].iloc[0]
+
+# ---------------------------
+# Batched Matrix Scoring
+# ---------------------------
+def match_blocked_cdist(candidates, names, domain_block=DOMAIN_BLOCK_SIZE,
+                        name_block=NAME_BLOCK_SIZE, score_cutoff=MATCH_THRESHOLD):
+    """
+    Score every candidate against every name with rapidfuzz cdist on all cores,
+    one domain_block x name_block matrix at a time, keeping only the running
+    best per candidate so the full domains x names matrix is never built.
+    Returns (tied_positions, best_scores): per candidate, the positions of
+    every name sharing its best score (empty, with score 0, when nothing
+    reached score_cutoff).
+    """
+    tied_positions = [[] for _ in candidates]
+    best_scores = np.zeros(len(candidates), dtype=np.float32)
+
+    for d_start in range(0, len(candidates), domain_block):
+        queries = candidates[d_start:d_start + domain_block]
+        rows = np.arange(len(queries))
+        block_scores = best_scores[d_start:d_start + len(queries)]
+
+        for n_start in range(0, len(names), name_block):
+            scores = process.cdist(
+                queries,
+                names[n_start:n_start + name_block],
+                scorer=fuzz.token_sort_ratio,
+                dtype=np.float32,
+                workers=-1,
+                score_cutoff=score_cutoff
+            )
+            top = scores[rows, scores.argmax(axis=1)]
+
+            # Only rows that reached the cutoff and tie or beat their best need a scan
+            for row in np.flatnonzero((top > 0) & (top >= block_scores)):
+                tied = (np.flatnonzero(scores[row] == top[row]) + n_start).tolist()
+                if top[row] > block_scores[row]:
+                    tied_positions[d_start + row] = tied
+                    block_scores[row] = top[row]
+                else:
+                    tied_positions[d_start + row].extend(tied)
+
+    return tied_positions, best_scores
+
+
+def read_table(path, columns, nrows=None):
+    """
+    Read only the needed columns from a Parquet or CSV intermediate, or from
+    a directory of part-*.csv / part-*.parquet shards (common_crawl_process's
+    output). Parquet reads are projected column by column; nrows applies to CSV only.
+    """
+    csv_shards = sorted(glob.glob(os.path.join(path, "part-*.csv"))) if os.path.isdir(path) else []
+    if csv_shards:
+        df = pd.concat(
+            (pd.read_csv(shard, usecols=columns, low_memory=False) for shard in csv_shards),
+            ignore_index=True
+        )
+        return df if nrows is None else df.iloc[:nrows]
+    if path.endswith(".parquet") or os.path.isdir(path):
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, usecols=columns, low_memory=False, nrows=nrows)
+
+
+def meta_titles(meta):
+    """
+    Page titles from the Common Crawl meta column: a struct (dicts) when read
+    from Parquet, or the stringified dict when read from CSV.
+    """
+    if meta.map(lambda m: isinstance(m, dict)).any():
+        return meta.str.get("title")
+    return meta.str.extract(r"'title': '([^']+)'")[0]
+
+
+# ---------------------------
+# Matching
+# ---------------------------
+# column -> SQLite type in the incremental state
+MATCH_COLUMNS = {
+    "abn": "INTEGER",
+    "entity_name": "TEXT",
+    "trading_name": "TEXT",
+    "matched_name": "TEXT",
+    "name_type": "TEXT",
+    "score": "REAL",
+    "tie_count": "INTEGER",
+    "tied_abns": "TEXT",
+}
+
+
+def match_queries(queries, names, index=None):
+    """
+    Best (tied name positions, score) per query against names, with the
+    n-gram index (built here when not given) or blocked cdist per MATCH_MODE.
+    """
+    if MATCH_MODE == "cdist":
+        tied, scores = match_blocked_cdist(queries, names)
+        return [(positions, float(score)) for positions, score in zip(tied, scores)]
+
+    index = index if index is not None else NgramIndex(names)
+    # No shared n-gram means nothing could score near the threshold
+    return [match_candidate(query, names, index) or ([], 0) for query in queries]
+
+
+def root_matches(roots, queries, name_table, abr):
+    """
+    Match each distinct domain root (queried as its segmented form) and
+    return one row per root with MATCH_COLUMNS, indexed by root.
+    """
+    owners = NameOwners(name_table)
+    best = match_queries(queries, owners.names) if len(roots) else []
+
+    table_rows = name_table["row"].to_numpy()
+    table_names = name_table["name"].to_numpy()
+    table_types = name_table["name_type"].to_numpy()
+    abns = abr["ABN"].to_numpy()
+    entity_names = abr["Entity_Name"].to_numpy()
+    trading_names = abr["Trading_Names"].to_numpy()
+
+    matches = []
+    for positions, score in best:
+        if score >= MATCH_THRESHOLD and positions:
+            # Every ABN holding a best-scoring name ties; an entity-name hit
+            # beats a trading-name hit, then the lowest row wins
+            held = owners.owners(positions)
+            rows = np.unique(table_rows[held])
+            hit = held[np.lexsort((table_rows[held], table_types[held] != "entity"))[0]]
+            pos = table_rows[hit]
             matches.append({
-                "domain": cc_row["domain"],
-                "url": cc_row["url"],
-                "abn": abn_row["ABN"],
-                "entity_name": abn_row["Entity_Name"],
-                "trading_name": abn_row["Trading_Names"],
-                "score": score
+                "abn": abns[pos],
+                "entity_name": entity_names[pos],
+                "trading_name": trading_names[pos],
+                "matched_name": table_names[hit],
+                "name_type": table_types[hit],
+                "score": score,
+                "tie_count": len(rows),
+                "tied_abns": "; ".join(str(abns[p]) for p in rows)
             })
         else:
             matches.append({
-                "domain": cc_row["domain"],
-                "url": cc_row["url"],
                 "abn": None,
                 "entity_name": None,
                 "trading_name": None,
-                "score": score
+                "matched_name": None,
+                "name_type": None,
+                "score": score,
+                "tie_count": 0,
+                "tied_abns": None
             })
 
-result = pd.DataFrame(matches)
-result.to_csv("domain_to_abn_matches.csv", index=False)
-# print(result.head(20))
+    result = pd.DataFrame(matches, columns=list(MATCH_COLUMNS), index=pd.Index(roots, name="domain_root"))
+    return result.astype({"abn": "Int64"})
+
+
+# ---------------------------
+# Incremental Runs
+# ---------------------------
+def open_state(path=STATE_DB):
+    """
+    SQLite state kept between incremental runs: the digest last seen per
+    page URL and the match last computed per domain root.
+    """
+    state = sqlite3.connect(path)
+    state.execute("CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, digest TEXT)")
+    state.execute(f"""
+        CREATE TABLE IF NOT EXISTS root_matches (
+            domain_root TEXT PRIMARY KEY,
+            {", ".join(f"{col} {sql_type}" for col, sql_type in MATCH_COLUMNS.items())}
+        )
+    """)
+    return state
+
+
+def save_state_rows(state, table, df):
+    """Upsert df (columns in the table's order) into a state table."""
+    df.to_sql("_incoming", state, if_exists="replace", index=False)
+    state.execute(f"INSERT OR REPLACE INTO {table} SELECT * FROM _incoming")
+    state.execute("DROP TABLE _incoming")
+
+
+def roots_to_rematch(roots, queries, stored, changed_abns, name_table):
+    """
+    Roots whose match can differ from the stored one:
+      - roots never matched before;
+      - roots whose stored tied ABNs include a changed ABN;
+      - roots that the names of changed ABNs alone now match at least as
+        well as the stored score (and above the threshold).
+    Everything else keeps its stored match without being scored.
+    """
+    roots = pd.Series(roots)
+    known = roots.isin(stored.index).to_numpy()
+    rematch = ~known
+
+    changed = {str(abn) for abn in changed_abns}
+    tied = stored["tied_abns"].reindex(roots).fillna("").str.split("; ")
+    rematch |= tied.map(lambda abns: not changed.isdisjoint(abns)).to_numpy()
+
+    delta_table = name_table[name_table["abn"].isin(changed_abns)]
+    check = np.flatnonzero(~rematch)
+    if len(delta_table) and len(check):
+        owners = NameOwners(delta_table)
+        best = match_queries([queries[i] for i in check], owners.names)
+        stored_scores = stored["score"].reindex(roots.iloc[check]).fillna(0).to_numpy()
+        for i, (positions, score), stored_score in zip(check, best, stored_scores):
+            if positions and score >= max(MATCH_THRESHOLD, stored_score):
+                rematch[i] = True
+    return rematch
+
+
+def main():
+    # --- load data ---
+    abr = read_table(ABR_PATH, ["ABN", "Entity_Name", "Trading_Names"], nrows=ABR_NROWS)
+    cc_columns = ["domain", "url", "meta", "digest"] if INCREMENTAL else ["domain", "url", "meta"]
+    cc = read_table(CC_PATH, cc_columns)
+
+    # normalize names, reusing the previous run's output for unchanged rows
+    source_key = f"{file_digest(ABR_PATH)}:{'all' if ABR_PATH.endswith('.parquet') else ABR_NROWS}"
+    abr[NORM_COLUMNS] = normalize_abr_names(abr, source_key)
+
+    cc["domain_root"] = domain_roots(cc["domain"]).fillna("")
+    cc["title_norm"] = normalize_names(meta_titles(cc["meta"]))
+
+    # Match against each entity and trading name separately, each distinct name once
+    name_table = explode_names(abr)
+
+    # Score each distinct root once; many hosts share a root
+    roots = pd.unique(cc["domain_root"])
+    if SPLIT_ROOTS:
+        segmenter = WordSegmenter(name_table["name"])
+        queries = [segmenter.split(root) for root in roots]
+    else:
+        queries = list(roots)
+
+    if INCREMENTAL:
+        state = open_state()
+        stored = pd.read_sql_query("SELECT * FROM root_matches", state, index_col="domain_root")
+        stored = stored.astype({"abn": "Int64"})
+        seen = pd.read_sql_query("SELECT url, digest FROM pages", state, index_col="url")["digest"]
+        changed_abns = (
+            read_table(ABR_DELTA_PATH, ["ABN"])["ABN"].dropna().astype("int64").unique()
+            if ABR_DELTA_PATH else []
+        )
+
+        rematch = roots_to_rematch(roots, queries, stored, changed_abns, name_table)
+        fresh = root_matches(roots[rematch], [q for q, r in zip(queries, rematch) if r], name_table, abr)
+        matches = pd.concat([stored.reindex(roots[~rematch]), fresh])
+        print(f"Rematched {rematch.sum()} of {len(roots)} domain roots "
+              f"({len(changed_abns)} new or updated ABNs)")
+
+        # Output only pages that are new or changed, or whose root matched differently
+        page_changed = (cc["digest"] != seen.reindex(cc["url"]).to_numpy()).to_numpy()
+        changed_pages = cc[page_changed]
+        cc = cc[page_changed | cc["domain_root"].isin(fresh.index).to_numpy()]
+    else:
+        matches = root_matches(roots, queries, name_table, abr)
+
+    result = (
+        cc[["domain", "url", "domain_root"]]
+        .join(matches, on="domain_root")
+        .drop(columns="domain_root")
+        .reset_index(drop=True)
+    )
+    if OUTPUT_PATH.endswith(".parquet"):
+        result.to_parquet(OUTPUT_PATH, index=False)
+    else:
+        result.to_csv(OUTPUT_PATH, index=False)
+
+    if INCREMENTAL:
+        # Metadata of new or changed pages only, for the loader's domains phase
+        pages = (
+            changed_pages[["domain", "url", "meta", "domain_root"]]
+            .join(matches["abn"], on="domain_root")
+            .dropna(subset=["abn"])
+        )
+        pages = pages[["domain", "abn", "url", "meta"]].reset_index(drop=True)
+        if CHANGED_PAGES_PATH.endswith(".parquet"):
+            pages.to_parquet(CHANGED_PAGES_PATH, index=False)
+        else:
+            pages.to_csv(CHANGED_PAGES_PATH, index=False)
+
+        # State is only saved once the output is written
+        save_state_rows(state, "pages", cc[["url", "digest"]].drop_duplicates("url", keep="last"))
+        save_state_rows(state, "root_matches", fresh.reset_index())
+        state.commit()
+        state.close()
+    # print(result.head(20))
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import os
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+# -------------------
+# CONFIG
+# -------------------
+# Offline copy of https://publicsuffix.org/list/public_suffix_list.dat (MPL 2.0).
+# Refresh it by replacing the file; nothing is downloaded at run time.
+PSL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "public_suffix_list.dat")
+INCLUDE_PRIVATE = False   # also treat private suffixes (e.g. hosting platforms) as public
+CACHE_SIZE = 1_000_000    # memoized hosts; many crawled hosts share a registrable domain
+# -------------------
+
+
+def load_rules(path=PSL_PATH, include_private=INCLUDE_PRIVATE):
+    """Read suffix rules from a public suffix list file."""
+    rules = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if "===BEGIN PRIVATE DOMAINS===" in line and not include_private:
+                break
+            if not line or line.startswith("//"):
+                continue
+            rules.append(line.split()[0].lower())
+    return rules
+
+
+def build_suffix_trie(rules):
+    """
+    Trie over reversed labels (com.au -> au -> com). A node holding "$"
+    ends a rule, "!" marks an exception rule, "*" is a wildcard label.
+    """
+    root = {}
+    for rule in rules:
+        exception = rule.startswith("!")
+        node = root
+        for label in reversed(rule.lstrip("!").split(".")):
+            node = node.setdefault(label, {})
+        node["!" if exception else "$"] = True
+    return root
+
+
+_TRIE = None
+
+
+def suffix_trie():
+    """The trie of the bundled list, built on first use."""
+    global _TRIE
+    if _TRIE is None:
+        _TRIE = build_suffix_trie(load_rules())
+    return _TRIE
+
+
+def public_suffix_length(labels, trie=None):
+    """
+    Number of trailing labels forming the public suffix, following the PSL
+    algorithm: longest matching rule wins, exception rules drop their
+    leftmost label, and an unlisted TLD counts as a one-label suffix.
+    """
+    node = trie if trie is not None else suffix_trie()
+    length = 1
+    for depth, label in enumerate(reversed(labels), start=1):
+        wildcard = node.get("*")
+        child = node.get(label)
+        if child is not None and "!" in child:
+            return depth - 1
+        if (child is not None and "$" in child) or (wildcard is not None and "$" in wildcard):
+            length = depth
+        if child is None:
+            break
+        node = child
+    return length
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def registrable_domain(host):
+    """shop.smithplumbing.com.au -> smithplumbing.com.au"""
+    labels = host.lower().strip(".").split(".")
+    n = public_suffix_length(labels)
+    return ".".join(labels[-(n + 1):])
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def domain_root(host):
+    """
+    The label just left of the public suffix:
+    www.smithplumbing.com.au, shop.smithplumbing.com -> smithplumbing.
+    A host that is itself a public suffix returns its first label.
+    """
+    labels = host.lower().strip(".").split(".")
+    n = public_suffix_length(labels)
+    return labels[-(n + 1)] if len(labels) > n else labels[0]
+
+
+def domain_roots(hosts):
+    """
+    Batch domain_root over a Series of hosts: each distinct host is resolved
+    once and the result broadcast back; missing hosts stay missing.
+    """
+    hosts = pd.Series(hosts)
+    codes, uniques = pd.factorize(hosts.str.lower())
+    roots = np.array([domain_root(h) for h in uniques] + [None], dtype=object)
+    # factorize marks missing values with -1, which picks the trailing None
+    return pd.Series(roots[codes], index=hosts.index)
@@ -1,9 +1,16 @@
 import os
+import shutil
 import zipfile
+import sqlite3
 import logging
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 import xml.etree.ElementTree as ET
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 # ---------------------------
 # Logging Configuration
@@ -42,74 +49,447 @@ def extract_all_zips(zip_dir, extract_to=None):
     return extracted_files
 
 
+def list_zip_xml_members(zip_dir):
+    """
+    List the XML members of all ZIP files in a directory without extracting them.
+    Returns (zip_path, member_name) sources that the parser reads straight
+    from the archive.
+    """
+    sources = []
+    for file in sorted(os.listdir(zip_dir)):
+        if file.lower().endswith(".zip"):
+            zip_path = os.path.join(zip_dir, file)
+            with zipfile.ZipFile(zip_path, "r") as zip_ref:
+                members = [name for name in zip_ref.namelist() if name.lower().endswith(".xml")]
+            logger.info(f"Found {len(members)} XML members in {zip_path}")
+            sources.extend((zip_path, name) for name in members)
+
+    return sources
+
+
+@contextmanager
+def open_xml_source(source):
+    """
+    Open an XML source for binary reading: either a file path or a
+    (zip_path, member_name) pair streamed out of the archive.
+    """
+    if isinstance(source, tuple):
+        zip_path, member = source
+        with zipfile.ZipFile(zip_path, "r") as zip_ref, zip_ref.open(member) as f:
+            yield f
+    else:
+        with open(source, "rb") as f:
+            yield f
+
+
+def source_name(source):
+    """Readable name of an XML source for logs."""
+    if isinstance(source, tuple):
+        return f"{source[0]}:{source[1]}"
+    return source
+
+
 # ---------------------------
 # XML Parsing
 # ---------------------------
+BATCH_SIZE = 50000  # records per chunk handed to the writer
+MAX_WORKERS = os.cpu_count()  # parallel mode: one XML split per process
+
+
+def abr_record(abr):
+    """
+    Build a record (dict) from a single <ABR> element.
+    """
+    abn_elem = abr.find("ABN")
+    gst_elem = abr.find("GST")
+
+    return {
+        "ABN": abn_elem.text if abn_elem is not None else "",
+        "ABN_Status": abn_elem.get("status") if abn_elem is not None else "",
+        "ABN_Status_From": abn_elem.get("ABNStatusFromDate") if abn_elem is not None else "",
+        "Entity_Type_Code": abr.findtext("EntityType/EntityTypeInd", ""),
+        "Entity_Type": abr.findtext("EntityType/EntityTypeText", ""),
+        "Entity_Name": abr.findtext("MainEntity/NonIndividualName/NonIndividualNameText", ""),
+        "Trading_Names": "; ".join([
+            n.text for n in abr.findall("OtherEntity/NonIndividualName/NonIndividualNameText")
+            if n is not None and n.text
+        ]),
+        "ASIC_Number": abr.findtext("ASICNumber", ""),
+        "GST_Status": gst_elem.get("status") if gst_elem is not None else "",
+        "GST_From": gst_elem.get("GSTStatusFromDate") if gst_elem is not None else "",
+        "State": abr.findtext("MainEntity/BusinessAddress/AddressDetails/State", ""),
+        "Postcode": abr.findtext("MainEntity/BusinessAddress/AddressDetails/Postcode", ""),
+        "Record_Last_Updated": abr.get("recordLastUpdatedDate", "")
+    }
+
+
+def iter_abr_records(xml_file):
+    """
+    Stream records (dicts) from a single XML source containing ABR data
+    (a file path or a (zip_path, member_name) pair).
+    Each <ABR> element is cleared once read and detached from the root,
+    so memory stays flat regardless of file size.
+    """
+    try:
+        with open_xml_source(xml_file) as f:
+            context = ET.iterparse(f, events=("start", "end"))
+            _, root = next(context)
+
+            for event, elem in context:
+                if event != "end" or elem.tag != "ABR":
+                    continue
+                yield abr_record(elem)
+                elem.clear()
+                root.clear()
+
+    except ET.ParseError as e:
+        logger.error(f"Failed to parse {source_name(xml_file)}: {e}")
+
+
+def iter_abr_batches(xml_file, batch_size=BATCH_SIZE):
+    """
+    Group the streamed records of an XML file into lists of batch_size.
+    """
+    batch = []
+    for record in iter_abr_records(xml_file):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
 def parse_abr_file(xml_file):
     """
     Parse a single XML file containing ABR data.
     Returns a list of records (dicts).
     """
-    records = []
-    try:
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-
-        for abr in root.findall(".//ABR"):
-            abn_elem = abr.find("ABN")
-
-            record = {
-                "ABN": abn_elem.text if abn_elem is not None else "",
-                "ABN_Status": abn_elem.get("status") if abn_elem is not None else "",
-                "ABN_Status_From": abn_elem.get("ABNStatusFromDate") if abn_elem is not None else "",
-                "Entity_Type_Code": abr.findtext("EntityType/EntityTypeInd", ""),
-                "Entity_Type": abr.findtext("EntityType/EntityTypeText", ""),
-                "Entity_Name": abr.findtext("MainEntity/NonIndividualName/NonIndividualNameText", ""),
-                "Trading_Names": "; ".join([
-                    n.text for n in abr.findall("OtherEntity/NonIndividualName/NonIndividualNameText")
-                    if n is not None and n.text
-                ]),
-                "ASIC_Number": abr.findtext("ASICNumber", ""),
-                "GST_Status": abr.find("GST").get("status") if abr.find("GST") is not None else "",
-                "GST_From": abr.find("GST").get("GSTStatusFromDate") if abr.find("GST") is not None else "",
-                "State": abr.findtext("MainEntity/BusinessAddress/AddressDetails/State", ""),
-                "Postcode": abr.findtext("MainEntity/BusinessAddress/AddressDetails/Postcode", ""),
-                "Record_Last_Updated": abr.get("recordLastUpdatedDate", "")
-            }
-            records.append(record)
+    return list(iter_abr_records(xml_file))
 
-    except ET.ParseError as e:
-        logger.error(f"Failed to parse {xml_file}: {e}")
 
-    return records
+# ---------------------------
+# Output Writers
+# ---------------------------
+ABR_SCHEMA = pa.schema([
+    ("ABN", pa.int64()),
+    ("ABN_Status", pa.string()),
+    ("ABN_Status_From", pa.date32()),
+    ("Entity_Type_Code", pa.string()),
+    ("Entity_Type", pa.string()),
+    ("Entity_Name", pa.string()),
+    ("Trading_Names", pa.string()),
+    ("ASIC_Number", pa.string()),   # keeps leading zeros
+    ("GST_Status", pa.string()),
+    ("GST_From", pa.date32()),
+    ("State", pa.string()),
+    ("Postcode", pa.string()),
+    ("Record_Last_Updated", pa.date32()),
+])
+DATE_COLUMNS = ["ABN_Status_From", "GST_From", "Record_Last_Updated"]
+
+
+def records_to_table(batch):
+    """
+    Convert a batch of records into a typed Arrow table (ABR dates are YYYYMMDD).
+    """
+    # Missing fields are null, as they are after a CSV round trip
+    df = pd.DataFrame(batch).replace("", None)
+    df["ABN"] = pd.to_numeric(df["ABN"], errors="coerce").astype("Int64")
+    for col in DATE_COLUMNS:
+        df[col] = pd.to_datetime(df[col], format="%Y%m%d", errors="coerce")
+    return pa.Table.from_pandas(df, schema=ABR_SCHEMA, preserve_index=False)
+
+
+class RecordWriter:
+    """
+    Append batches of records to a CSV or Parquet file, chosen by extension.
+    Parquet output is typed by ABR_SCHEMA and written one row group per batch.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        self.count = 0
+        self._writer = None
+
+    def write(self, batch):
+        if self.parquet:
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, ABR_SCHEMA)
+            self._writer.write_table(records_to_table(batch))
+        else:
+            pd.DataFrame(batch).to_csv(
+                self.path,
+                mode="w" if self.count == 0 else "a",
+                header=self.count == 0,
+                index=False
+            )
+        self.count += len(batch)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 
 # ---------------------------
 # Processing Pipeline
 # ---------------------------
-def process_all_xml(xml_files, output_csv):
+def process_all_xml(xml_files, output_path, batch_size=BATCH_SIZE):
     """
-    Convert multiple XML files into a single CSV file.
+    Convert multiple XML files into a single CSV or Parquet file,
+    appending one batch of records at a time.
     """
-    all_records = []
-
-    for xml_file in xml_files:
-        records = parse_abr_file(xml_file)
-        if not records:
-            logger.warning(f"No records found in {xml_file}")
-            continue
+    with RecordWriter(output_path) as writer:
+        for xml_file in xml_files:
+            file_total = 0
+            for batch in iter_abr_batches(xml_file, batch_size):
+                writer.write(batch)
+                file_total += len(batch)
 
-        all_records.extend(records)
-        logger.info(f"Parsed {len(records)} records from {xml_file}")
+            if not file_total:
+                logger.warning(f"No records found in {source_name(xml_file)}")
+                continue
+            logger.info(f"Parsed {file_total} records from {source_name(xml_file)}")
 
-    if not all_records:
+    if not writer.count:
         logger.warning("No records found in any XML file.")
         return
 
-    df = pd.DataFrame(all_records)
-    df.to_csv(output_csv, index=False)
-    logger.info(f"Saved {len(df)} total records → {output_csv}")
+    logger.info(f"Saved {writer.count} total records → {output_path}")
+
+
+def process_xml_to_shard(xml_file, shard_path, batch_size=BATCH_SIZE):
+    """
+    Convert a single XML file into its own CSV or Parquet shard.
+    Returns the number of records written (0 means no shard was written).
+    """
+    with RecordWriter(shard_path) as writer:
+        for batch in iter_abr_batches(xml_file, batch_size):
+            writer.write(batch)
+    return writer.count
+
+
+def shard_path_for(xml_file, output_dir, output_format):
+    """Shard written for an XML source: the member's base name in output_dir."""
+    member = xml_file[1] if isinstance(xml_file, tuple) else xml_file
+    return os.path.join(output_dir, f"{os.path.splitext(os.path.basename(member))[0]}.{output_format}")
+
+
+def process_all_xml_parallel(xml_files, output_dir, max_workers=MAX_WORKERS,
+                             merge_to=None, batch_size=BATCH_SIZE, output_format="csv"):
+    """
+    Convert XML files in parallel, one process and one shard per file
+    (output_format "csv" or "parquet").
+    Optionally merge the shards into a single file of the same format (merge_to).
+    Returns the list of shard paths written.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    shards = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for xml_file in xml_files:
+            shard_path = shard_path_for(xml_file, output_dir, output_format)
+            futures[executor.submit(process_xml_to_shard, xml_file, shard_path, batch_size)] = (xml_file, shard_path)
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            xml_file, shard_path = futures[future]
+            try:
+                count = future.result()
+            except Exception as e:
+                logger.error(f"[{done}/{len(futures)}] Failed to process {source_name(xml_file)}: {e}")
+                continue
+
+            if not count:
+                logger.warning(f"[{done}/{len(futures)}] No records found in {source_name(xml_file)}")
+                continue
+            shards[xml_file] = shard_path
+            logger.info(f"[{done}/{len(futures)}] Parsed {count} records from {source_name(xml_file)} → {shard_path}")
+
+    # Keep input order so merged output is deterministic
+    shard_paths = [shards[f] for f in xml_files if f in shards]
+    if not shard_paths:
+        logger.warning("No records found in any XML file.")
+    elif merge_to and output_format == "parquet":
+        merge_parquet_shards(shard_paths, merge_to)
+    elif merge_to:
+        merge_csv_shards(shard_paths, merge_to)
+
+    return shard_paths
+
+
+def merge_csv_shards(shard_paths, output_csv):
+    """
+    Concatenate CSV shards into one file, keeping only the first header.
+    """
+    with open(output_csv, "w", encoding="utf-8", newline="") as out:
+        for i, shard in enumerate(shard_paths):
+            with open(shard, "r", encoding="utf-8", newline="") as f:
+                header = f.readline()
+                if i == 0:
+                    out.write(header)
+                shutil.copyfileobj(f, out)
+    logger.info(f"Merged {len(shard_paths)} shards → {output_csv}")
+
+
+def merge_parquet_shards(shard_paths, output_parquet):
+    """
+    Concatenate Parquet shards into one file, copying one row group at a time.
+    """
+    with pq.ParquetWriter(output_parquet, ABR_SCHEMA) as writer:
+        for shard in shard_paths:
+            shard_file = pq.ParquetFile(shard)
+            for i in range(shard_file.num_row_groups):
+                writer.write_table(shard_file.read_row_group(i))
+    logger.info(f"Merged {len(shard_paths)} shards → {output_parquet}")
+
+
+# ---------------------------
+# Incremental Runs
+# ---------------------------
+STATE_DB = "abr_state.sqlite"
+
+
+def open_state(path=STATE_DB):
+    """
+    SQLite state kept between runs: a fingerprint per XML source and the
+    last seen Record_Last_Updated (YYYYMMDD int) per ABN.
+    """
+    state = sqlite3.connect(path)
+    state.execute("CREATE TABLE IF NOT EXISTS abr_sources (source TEXT PRIMARY KEY, fingerprint TEXT NOT NULL)")
+    state.execute("CREATE TABLE IF NOT EXISTS abr_records (abn INTEGER PRIMARY KEY, record_last_updated INTEGER)")
+    return state
+
+
+def source_fingerprint(source):
+    """
+    Cheap change check for an XML source: CRC and size of a ZIP member
+    (read from the archive directory, nothing is decompressed), or size
+    and mtime of a file on disk.
+    """
+    if isinstance(source, tuple):
+        with zipfile.ZipFile(source[0], "r") as zip_ref:
+            info = zip_ref.getinfo(source[1])
+        return f"{info.CRC}:{info.file_size}"
+    stat = os.stat(source)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def shard_updates(shard):
+    """
+    Read a shard; returns (data, ABN as Int64, Record_Last_Updated as
+    YYYYMMDD ints, 0 when missing). data is an Arrow table for Parquet
+    shards and a DataFrame of strings for CSV shards.
+    """
+    if shard.endswith(".parquet"):
+        data = pq.read_table(shard)
+        df = data.select(["ABN", "Record_Last_Updated"]).to_pandas()
+        updated = pd.to_datetime(df["Record_Last_Updated"])
+    else:
+        data = df = pd.read_csv(shard, dtype=str)
+        updated = pd.to_datetime(df["Record_Last_Updated"], format="%Y%m%d", errors="coerce")
+
+    abn = pd.to_numeric(df["ABN"], errors="coerce").astype("Int64")
+    updated = (updated.dt.year * 10000 + updated.dt.month * 100 + updated.dt.day).fillna(0).astype("int64")
+    return data, abn, updated
+
+
+def write_delta(shard_paths, delta_path, state):
+    """
+    Write the records of shard_paths that are new, or carry a newer
+    Record_Last_Updated than last seen, to delta_path (CSV or Parquet by
+    extension), and record their dates in state (not committed).
+    Returns the number of delta records.
+    """
+    seen = pd.read_sql_query(
+        "SELECT abn, record_last_updated FROM abr_records", state, index_col="abn"
+    )["record_last_updated"]
+
+    parquet = delta_path.endswith(".parquet")
+    writer = pq.ParquetWriter(delta_path, ABR_SCHEMA) if parquet else None
+    total = 0
+    try:
+        if not parquet:
+            # Header only, so the delta file exists even when nothing changed
+            pd.DataFrame(columns=ABR_SCHEMA.names).to_csv(delta_path, index=False)
+
+        for shard in shard_paths:
+            data, abn, updated = shard_updates(shard)
+            valid = abn.notna().to_numpy()
+            previous = seen.reindex(abn[valid].astype("int64")).to_numpy(dtype="float64")
+
+            changed = np.zeros(len(abn), dtype=bool)
+            changed[valid] = np.isnan(previous) | (updated[valid].to_numpy() > previous)
+
+            if parquet:
+                writer.write_table(data.filter(pa.array(changed)))
+            else:
+                data[changed].to_csv(delta_path, mode="a", header=False, index=False)
+
+            state.executemany(
+                "INSERT OR REPLACE INTO abr_records (abn, record_last_updated) VALUES (?, ?)",
+                zip(abn[changed].astype("int64").tolist(), updated[changed].tolist())
+            )
+            total += int(changed.sum())
+            logger.info(f"{changed.sum()} new or updated records in {shard}")
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return total
+
+
+def process_all_xml_incremental(xml_files, output_dir, merge_to, delta_path, state_path=STATE_DB,
+                                max_workers=MAX_WORKERS, output_format="csv"):
+    """
+    Incremental variant of process_all_xml_parallel:
+      - only XML sources whose fingerprint changed since the last run (or
+        whose shard is missing) are parsed again; other shards are reused;
+      - records that are new or have a newer Record_Last_Updated are
+        written to delta_path for domain_match and load_postgres;
+      - the full output is still merged from every shard (merge_to).
+    State is committed only once the delta is written, so an interrupted
+    run is redone in full next time.
+    """
+    state = open_state(state_path)
+    known = dict(state.execute("SELECT source, fingerprint FROM abr_sources"))
+    fingerprints = {src: source_fingerprint(src) for src in xml_files}
+    changed = [
+        src for src in xml_files
+        if known.get(source_name(src)) != fingerprints[src]
+        or not os.path.exists(shard_path_for(src, output_dir, output_format))
+    ]
+    logger.info(f"{len(changed)} of {len(xml_files)} XML sources changed since the last run")
+
+    new_shards = process_all_xml_parallel(changed, output_dir, max_workers, output_format=output_format) if changed else []
+    delta_count = write_delta(new_shards, delta_path, state)
+
+    parsed = [src for src in changed if shard_path_for(src, output_dir, output_format) in new_shards]
+    state.executemany(
+        "INSERT OR REPLACE INTO abr_sources (source, fingerprint) VALUES (?, ?)",
+        [(source_name(src), fingerprints[src]) for src in parsed]
+    )
+    state.commit()
+    state.close()
+    logger.info(f"Saved {delta_count} new or updated records → {delta_path}")
 
+    shard_paths = [
+        path for path in (shard_path_for(src, output_dir, output_format) for src in xml_files)
+        if os.path.exists(path)
+    ]
+    if merge_to and output_format == "parquet":
+        merge_parquet_shards(shard_paths, merge_to)
+    elif merge_to:
+        merge_csv_shards(shard_paths, merge_to)
+    return delta_count
 
 
 # ---------------------------
@@ -117,10 +497,26 @@ def process_all_xml(xml_files, output_csv):
 # ---------------------------
 if __name__ == "__main__":
     base_dir = "/path/of/zips"
-    output_dir = os.path.join(base_dir, "csv_output")
+    output_format = "parquet"  # or "csv"
+    output_path = os.path.join(base_dir, f"abr_entities.{output_format}")
+    shard_dir = os.path.join(base_dir, "shards")
+    parallel = True
+    extract_to_disk = False  # stream XML straight out of the ZIPs by default
+    incremental = True       # reuse unchanged shards and write only changed records to delta_path
+    delta_path = os.path.join(base_dir, f"abr_entities_delta.{output_format}")
+    state_path = os.path.join(base_dir, STATE_DB)
 
-    # Step 1: Extract all zips & collect XML files
-    xml_files = extract_all_zips(base_dir)
+    # Step 1: Collect XML sources (extracting to disk only if asked)
+    if extract_to_disk:
+        xml_files = extract_all_zips(base_dir)
+    else:
+        xml_files = list_zip_xml_members(base_dir)
 
-    # Step 2: Process each XML into individual CSVs
-    process_all_xml(xml_files, output_dir)
+    # Step 2: Stream every XML into a single CSV/Parquet file
+    if incremental:
+        process_all_xml_incremental(xml_files, shard_dir, output_path, delta_path, state_path,
+                                    output_format=output_format)
+    elif parallel:
+        process_all_xml_parallel(xml_files, shard_dir, merge_to=output_path, output_format=output_format)
+    else:
+        process_all_xml(xml_files, output_path)
@@ -0,0 +1,63 @@
+import sys
+import glob
+import time
+from warcio.archiveiterator import ArchiveIterator
+from common_crawl_process import HTML_EXTRACTORS, META_FIELDS
+
+# -------------------
+# Benchmark the HTML metadata extractors on saved WARC records.
+#
+#   python bench_extractors.py "warc_samples/*.warc.gz"
+#
+# Reports time per page for each extractor and, per field, how often the
+# fast extractor agrees with the BeautifulSoup reference.
+# -------------------
+
+
+def load_pages(pattern):
+    """Read the HTML payload of every response record in the matching WARC files."""
+    pages = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "rb") as f:
+            for record in ArchiveIterator(f):
+                if record.rec_type == "response":
+                    pages.append(record.content_stream().read())
+    return pages
+
+
+def run_extractor(name, pages):
+    """Run one extractor over all pages; returns (seconds, list of metadata dicts)."""
+    extract = HTML_EXTRACTORS[name]
+    results = []
+    start = time.perf_counter()
+    for html in pages:
+        metadata = dict.fromkeys(META_FIELDS)
+        try:
+            extract(html, metadata)
+        except Exception as e:
+            print(f"{name}: error extracting metadata: {e}")
+        results.append(metadata)
+    return time.perf_counter() - start, results
+
+
+def main(pattern):
+    pages = load_pages(pattern)
+    if not pages:
+        raise FileNotFoundError(f"No response records found in {pattern}")
+    print(f"Loaded {len(pages)} pages ({sum(map(len, pages)) / 1e6:.1f} MB)")
+
+    timings = {}
+    results = {}
+    for name in ["bs4", "fast"]:
+        timings[name], results[name] = run_extractor(name, pages)
+        print(f"{name:>5}: {timings[name]:.2f}s total, {1000 * timings[name] / len(pages):.2f} ms/page")
+    print(f"speedup: {timings['bs4'] / timings['fast']:.1f}x")
+
+    print("\nField agreement (fast vs bs4):")
+    for field in META_FIELDS:
+        same = sum(a[field] == b[field] for a, b in zip(results["bs4"], results["fast"]))
+        print(f"  {field:<20} {100 * same / len(pages):6.2f}%")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "warc_samples/*.warc.gz")
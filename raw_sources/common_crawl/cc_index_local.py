@@ -0,0 +1,158 @@
+import os
+import gzip
+import json
+import glob
+import bisect
+import pandas as pd
+import pyarrow.dataset as ds
+
+# -------------------
+# Read locally mirrored Common Crawl index shards instead of paging
+# through index.commoncrawl.org. Two layouts are supported:
+#
+#   - columnar cc-index (Parquet):
+#       cc-index/table/cc-main/warc/crawl=CC-MAIN-2025-13/subset=warc/*.parquet
+#   - zipnum CDX:
+#       cc-index/collections/CC-MAIN-2025-13/indexes/{cluster.idx, cdx-00000.gz, ...}
+#
+# Both yield records with the same fields as the CDX server's JSON output
+# and can be saved as page_<n>.jsonl files for common_crawl_process.main.
+# -------------------
+PARQUET_INDEX_DIR = "cc-index/table/cc-main/warc/crawl=CC-MAIN-2025-13/subset=warc"
+ZIPNUM_INDEX_DIR = "cc-index/collections/CC-MAIN-2025-13/indexes"
+OUTPUT_DIR = "common_crawl_pages"
+BATCH_SIZE = 100000
+
+# cc-index column -> CDX server JSON field
+PARQUET_COLUMNS = {
+    "url_host_name": "domain",
+    "url": "url",
+    "fetch_time": "timestamp",
+    "fetch_status": "status",
+    "content_mime_type": "mime",
+    "content_digest": "digest",
+    "warc_record_length": "length",
+    "warc_record_offset": "offset",
+    "warc_filename": "filename",
+}
+
+
+# -------------------
+# Columnar (Parquet) cc-index
+# -------------------
+def iter_parquet_index_records(index_dir=PARQUET_INDEX_DIR, tld="au", hosts=None, batch_size=BATCH_SIZE):
+    """
+    Scan the Parquet cc-index with predicate pushdown on url_host_tld
+    (and url_host_name when hosts is given), reading only the columns the
+    pipeline uses. Yields DataFrames with CDX field names.
+    """
+    dataset = ds.dataset(index_dir, format="parquet", partitioning="hive")
+
+    predicate = ds.field("url_host_tld") == tld
+    if hosts:
+        predicate = predicate & ds.field("url_host_name").isin(list(hosts))
+
+    scanner = dataset.scanner(columns=list(PARQUET_COLUMNS), filter=predicate, batch_size=batch_size)
+    for batch in scanner.to_batches():
+        if batch.num_rows == 0:
+            continue
+        df = batch.to_pandas().rename(columns=PARQUET_COLUMNS)
+        df["timestamp"] = pd.to_datetime(df["timestamp"]).dt.strftime("%Y%m%d%H%M%S")
+        yield df
+
+
+# -------------------
+# Zipnum CDX (cluster.idx + cdx-NNNNN.gz)
+# -------------------
+def host_to_surt(host):
+    """example.com.au -> au,com,example"""
+    return ",".join(reversed(host.lower().split(".")))
+
+
+def read_cluster_index(index_dir=ZIPNUM_INDEX_DIR):
+    """
+    Load cluster.idx: one line per gzip block of the cdx-NNNNN.gz shards,
+    "<surt key> <timestamp>\t<cdx file>\t<offset>\t<length>\t<seq>".
+    Returns (keys, blocks) sorted by key.
+    """
+    keys, blocks = [], []
+    with open(os.path.join(index_dir, "cluster.idx"), encoding="utf-8") as f:
+        for line in f:
+            key, cdx_file, offset, length = line.rstrip("\n").split("\t")[:4]
+            keys.append(key)
+            blocks.append((cdx_file, int(offset), int(length)))
+    return keys, blocks
+
+
+def iter_zipnum_index_records(index_dir=ZIPNUM_INDEX_DIR, tld="au", hosts=None):
+    """
+    Binary-search cluster.idx for the blocks covering the SURT prefix of
+    the TLD (or of each host), then decompress only those blocks.
+    Yields CDX records (dicts).
+    """
+    keys, blocks = read_cluster_index(index_dir)
+    prefixes = sorted(host_to_surt(h) + ")" for h in hosts) if hosts else [tld + ","]
+
+    for prefix in prefixes:
+        # The block before the first key >= prefix may already hold matching lines
+        start = max(bisect.bisect_left(keys, prefix) - 1, 0)
+        for i in range(start, len(keys)):
+            if i > start and not keys[i].startswith(prefix):
+                break
+            cdx_file, offset, length = blocks[i]
+            with open(os.path.join(index_dir, cdx_file), "rb") as f:
+                f.seek(offset)
+                block = gzip.decompress(f.read(length))
+
+            for line in block.decode("utf-8").splitlines():
+                surt, timestamp, payload = line.split(" ", 2)
+                if not surt.startswith(prefix):
+                    continue
+                rec = json.loads(payload)
+                rec["timestamp"] = timestamp
+                yield rec
+
+
+# -------------------
+# Save as CDX-style pages
+# -------------------
+def save_index_pages(batches, output_dir=OUTPUT_DIR):
+    """
+    Write each batch (DataFrame or list of dicts) as page_<n>.jsonl, the
+    same layout extract.fetch_all_index_records produces.
+    Returns the number of records written.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    page_num = len(glob.glob(os.path.join(output_dir, "page_*.jsonl")))
+
+    total = 0
+    for batch in batches:
+        df = batch if isinstance(batch, pd.DataFrame) else pd.DataFrame(batch)
+        if df.empty:
+            continue
+        page_num += 1
+        df.astype("string").to_json(os.path.join(output_dir, f"page_{page_num}.jsonl"), orient="records", lines=True)
+        total += len(df)
+        print(f"Page {page_num} saved ({len(df)} records)")
+
+    return total
+
+
+def chunked(records, size=BATCH_SIZE):
+    """Group a record stream into lists of size."""
+    chunk = []
+    for rec in records:
+        chunk.append(rec)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+if __name__ == "__main__":
+    if os.path.isdir(PARQUET_INDEX_DIR):
+        total = save_index_pages(iter_parquet_index_records())
+    else:
+        total = save_index_pages(chunked(iter_zipnum_index_records()))
+    print(f"Saved {total} index records to {OUTPUT_DIR}")
@@ -1,112 +1,102 @@
 import requests
 import json
+import codecs
+import io
+import re
+import random
+import asyncio
+import aiohttp
 import pandas as pd
-from urllib.parse import urlparse
 from warcio.archiveiterator import ArchiveIterator
 from bs4 import BeautifulSoup
+from bs4.dammit import EncodingDetector, UnicodeDammit
+from selectolax.lexbor import LexborHTMLParser
 from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from collections import defaultdict, namedtuple
 import glob
 import os 
-import csv
+import pyarrow as pa
+import pyarrow.parquet as pq
 # -------------------
 # CONFIG
 # -------------------
-CC_INDEX_BASE = "http://index.commoncrawl.org/CC-MAIN-2025-13-index"
-OUTPUT_CSV = "au_domains_march2025.csv"
+OUTPUT_DIR = "au_domains_march2025.parquet"  # rolling part-NNNNN shards; read back as one Parquet dataset
+OUTPUT_FORMAT = "parquet"  # shard format: "parquet" (typed, columnar) or "csv"
+ROWS_PER_SHARD = 50000     # results buffered before a shard is written (a restart skips written rows)
 MAX_RECORDS = 1000000   # limit for testing; increase/remove for full run
+PAGE_CHUNK_SIZE = 100000  # index records read per chunk by the .au pre-filter
 MAX_WORKERS = 30  # tune based on bandwidth & CPU
+CC_DATA_BASE = "https://data.commoncrawl.org"  # point at a local stand-in for testing
+FETCH_MODE = "async"  # "async" (pooled aiohttp) or "threads" (ThreadPoolExecutor)
+ASYNC_CONCURRENCY = 2000  # WARC range requests in flight
+ASYNC_CONN_LIMIT = 200    # pooled keep-alive connections to data.commoncrawl.org
+ASYNC_CONNECT_TIMEOUT = 30  # seconds to open a socket (waiting for a pooled slot is not counted)
+ASYNC_READ_TIMEOUT = 60     # seconds without data on an open socket
+MAX_RETRIES = 5           # retries on 429/503, with exponential backoff
+PARSE_WORKERS = os.cpu_count()  # processes parsing fetched payloads
+PARSE_QUEUE_SIZE = 1000         # fetched records waiting for a parser; fetching pauses when full
+DEFAULT_RECORD_LENGTH = 1024*1024  # only used when an index record has no length
+COALESCE_RANGES = True             # merge nearby records of the same WARC file into one request
+COALESCE_MAX_GAP = 64*1024         # max unused bytes between two records in a merged range
+COALESCE_MAX_SPAN = 8*1024*1024    # max size of a merged range
+HTML_EXTRACTOR = "fast"            # "fast" (selectolax, truncated input) or "bs4" (full tree)
+HEAD_ONLY = False                  # fast extractor: stop at </head> (no h1 / social links)
+BODY_SCAN_BYTES = 256*1024         # fast extractor: ignore h1, <a> and JSON-LD past this many bytes
 # -------------------
 
 
 
-CC_INDEX_BASE = "https://index.commoncrawl.org/CC-MAIN-2024-38-index" # Example, you should use the latest index.
+# Index pages are fetched by extract.fetch_all_index_records, e.g.
+# fetch_all_index_records("*.nasa.gov/*")
 
-def fetch_all_index_records(url_pattern: str, start_page: int = 0):
+
+
+
+def warc_range(offset, length=None):
     """
-    Fetches all records for a given URL pattern from the Common Crawl
-    index server, handling pagination automatically and saving each page
-    to a separate CSV file. Allows starting the fetch from a specific page.
+    Byte range covering exactly one WARC record, using the index record's
+    length field. HTTP ranges are inclusive, so the end is offset+length-1.
     """
-    
-    # Create the directory to save the CSV files
-    output_dir = "common_crawl_pages"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    # --- 1. Get the total number of pages to determine the scope of the fetch ---
-    initial_params = {
-        'url': url_pattern,
-        'output': 'json',
-        'showNumPages': 'true'
-    }
-    
-    print(f"Fetching page count for {url_pattern}...")
-    try:
-        response = requests.get(CC_INDEX_BASE, params=initial_params, stream=True)
-        response.raise_for_status()
-        
-        # The first response is a single line with page count info
-        page_info = json.loads(next(response.iter_lines()).decode('utf-8'))
-        total_pages = page_info.get('pages', 1)
-        print(f"Total pages to retrieve: {total_pages}\n")
-
-        # Limit to 100 pages to avoid overwhelming the server for testing purposes
-        total_pages = min(100, total_pages)
-    except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
-        print(f"Error fetching page count: {e}. Assuming single page.")
-        total_pages = 1
-
-    # --- 2. Iterate through each page and save records as CSV ---
-    # The loop now starts from the 'start_page' provided by the user
-    for page_num in range(start_page, total_pages):
-        print(f"Fetching page {page_num + 1} of {total_pages}...")
-        
-        # Parameters for the actual data retrieval
-        params = {
-            'url': url_pattern,
-            'output': 'json',
-            'page': page_num
-        }
-        
-        try:
-            resp = requests.get(CC_INDEX_BASE, params=params, stream=True)
-            resp.raise_for_status()
-
-            records_list = [json.loads(line) for line in resp.iter_lines() if line]
-            
-            if records_list:
-                # Get the fieldnames from the keys of the first record
-                fieldnames = records_list[0].keys()
-                
-                # Define the CSV file path for the current page
-                csv_filename = os.path.join(output_dir, f"page_{page_num + 1}.csv")
-                
-                with open(csv_filename, 'w', newline='', encoding='utf-8') as csvfile:
-                    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                    writer.writeheader()
-                    writer.writerows(records_list)
-                print(f"Page {page_num + 1} saved to {csv_filename}")
-
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching page {page_num}: {e}")
-            continue
-
-# Example Usage
-# Start fetching from page 5 for the given URL pattern
-# fetch_all_index_records("*.nasa.gov/*", start_page=4)
-
-
-
-
-def fetch_warc_record(filename, offset, length=1024*1024):
+    offset = int(offset)
+    length = int(length) if pd.notna(length) else DEFAULT_RECORD_LENGTH
+    return f"bytes={offset}-{offset + length - 1}"
+
+
+def fetch_warc_record(filename, offset, length=None):
     """Fetch a WARC record by byte range from Common Crawl."""
-    url = f"https://data.commoncrawl.org/{filename}"
-    headers = {"Range": f"bytes={offset}-{offset+length}"}
+    url = f"{CC_DATA_BASE}/{filename}"
+    headers = {"Range": warc_range(offset, length)}
     resp = requests.get(url, headers=headers, stream=True, timeout=60)
     resp.raise_for_status()
+    if resp.status_code != 206:
+        resp.close()
+        raise ValueError(f"{url}: expected 206 Partial Content, got {resp.status_code}")
     return resp.raw
 
+
+async def fetch_warc_record_async(session, filename, offset, length=None, retries=MAX_RETRIES):
+    """
+    Fetch a WARC record by byte range over a shared aiohttp session.
+    Retries 429/503 with exponential backoff (or the server's Retry-After).
+    Returns the raw bytes of the range; a response that ignored the Range
+    header (anything but 206) is an error, not a whole WARC file to read.
+    """
+    url = f"{CC_DATA_BASE}/{filename}"
+    headers = {"Range": warc_range(offset, length)}
+
+    for attempt in range(retries + 1):
+        async with session.get(url, headers=headers) as resp:
+            if resp.status not in (429, 503) or attempt == retries:
+                resp.raise_for_status()
+                if resp.status != 206:
+                    raise ValueError(f"{url}: expected 206 Partial Content, got {resp.status}")
+                return await resp.read()
+            retry_after = resp.headers.get("Retry-After", "")
+
+        delay = float(retry_after) if retry_after.isdigit() else min(60, 2 ** attempt)
+        await asyncio.sleep(delay + random.uniform(0, 1))
+
 import boto3
 from botocore import UNSIGNED
 from botocore.client import Config
@@ -114,12 +104,12 @@ from botocore.client import Config
 # Public S3 client (no creds needed)
 s3 = boto3.client("s3", config=Config(signature_version=UNSIGNED))
 
-def fetch_warc_record_s3(filename, offset, length=1024*1024):
+def fetch_warc_record_s3(filename, offset, length=None):
     """Fetch a WARC record by byte range from Common Crawl S3."""
     resp = s3.get_object(
         Bucket="commoncrawl",
         Key=filename,
-        Range=f"bytes={offset}-{offset+length-1}"
+        Range=warc_range(offset, length)
     )
     return resp["Body"].read()
 
@@ -141,8 +131,8 @@ def extract_title_description(filename, offset):
 
 
 
-def extract_page_metadata(filename, offset):
-    """Extract common metadata fields and social media links from a WARC record."""
+def extract_warc_metadata(stream, extractor=None):
+    """Extract common metadata fields and social media links from a raw WARC record stream."""
     # Initialize defaults
     metadata = {
         "title": None,
@@ -164,87 +154,13 @@ def extract_page_metadata(filename, offset):
     }
 
     try:
-        stream = fetch_warc_record(filename, int(offset))
         for record in ArchiveIterator(stream):
             if record.rec_type != "response":
                 continue
 
             html = record.content_stream().read()
-            soup = BeautifulSoup(html, "html.parser")
-
-            # --- Basic Metadata ---
-            if soup.title and soup.title.string:
-                metadata["title"] = soup.title.string.strip()
-
-            desc_tag = soup.find("meta", attrs={"name": "description"})
-            if desc_tag and desc_tag.get("content"):
-                metadata["description"] = desc_tag["content"].strip()
-
-            kw_tag = soup.find("meta", attrs={"name": "keywords"})
-            if kw_tag and kw_tag.get("content"):
-                metadata["keywords"] = kw_tag["content"].strip()
-
-            # OpenGraph
-            metadata["og_title"] = (soup.find("meta", property="og:title") or {}).get("content")
-            metadata["og_description"] = (soup.find("meta", property="og:description") or {}).get("content")
-            metadata["og_site_name"] = (soup.find("meta", property="og:site_name") or {}).get("content")
-
-            # Twitter
-            metadata["twitter_title"] = (soup.find("meta", attrs={"name": "twitter:title"}) or {}).get("content")
-            metadata["twitter_description"] = (soup.find("meta", attrs={"name": "twitter:description"}) or {}).get("content")
-
-            # Canonical
-            canon = soup.find("link", rel="canonical")
-            if canon and canon.get("href"):
-                metadata["canonical"] = canon["href"]
-
-            # H1
-            h1 = soup.find("h1")
-            if h1:
-                metadata["h1"] = h1.get_text(strip=True)
-
-            # Language
-            if soup.html and soup.html.has_attr("lang"):
-                metadata["language"] = soup.html["lang"]
-
-            # --- Social Media Links ---
-            for a in soup.find_all("a", href=True):
-                href = a["href"].lower()
-                if "linkedin.com" in href and not metadata["linkedin"]:
-                    metadata["linkedin"] = href
-                elif "facebook.com" in href and not metadata["facebook"]:
-                    metadata["facebook"] = href
-                elif ("twitter.com" in href or "x.com" in href) and not metadata["twitter"]:
-                    metadata["twitter"] = href
-                elif "instagram.com" in href and not metadata["instagram"]:
-                    metadata["instagram"] = href
-                elif "youtube.com" in href and not metadata["youtube"]:
-                    metadata["youtube"] = href
-
-            # Structured data (JSON-LD -> sameAs)
-            for script in soup.find_all("script", type="application/ld+json"):
-                if not script.string:
-                    continue
-                try:
-                    data = json.loads(script.string)
-                    if isinstance(data, dict) and "sameAs" in data:
-                        same_as = data["sameAs"]
-                        if isinstance(same_as, str):
-                            same_as = [same_as]
-                        for link in same_as:
-                            link_l = link.lower()
-                            if "linkedin.com" in link_l:
-                                metadata["linkedin"] = link
-                            elif "facebook.com" in link_l:
-                                metadata["facebook"] = link
-                            elif "twitter.com" in link_l or "x.com" in link_l:
-                                metadata["twitter"] = link
-                            elif "instagram.com" in link_l:
-                                metadata["instagram"] = link
-                            elif "youtube.com" in link_l:
-                                metadata["youtube"] = link
-                except Exception:
-                    continue
+            charset = header_charset(record.http_headers.get_header("Content-Type") if record.http_headers else None)
+            HTML_EXTRACTORS[extractor or HTML_EXTRACTOR](html, metadata, charset=charset)
 
             break  # only process the first "response" record
 
@@ -254,72 +170,568 @@ def extract_page_metadata(filename, offset):
     return metadata
 
 
+def match_social_links(hrefs, metadata):
+    """Keep the first <a href> seen for each social platform."""
+    for href in hrefs:
+        href = href.lower()
+        if "linkedin.com" in href and not metadata["linkedin"]:
+            metadata["linkedin"] = href
+        elif "facebook.com" in href and not metadata["facebook"]:
+            metadata["facebook"] = href
+        elif ("twitter.com" in href or "x.com" in href) and not metadata["twitter"]:
+            metadata["twitter"] = href
+        elif "instagram.com" in href and not metadata["instagram"]:
+            metadata["instagram"] = href
+        elif "youtube.com" in href and not metadata["youtube"]:
+            metadata["youtube"] = href
+
+
+def apply_same_as(ld_json, metadata):
+    """Structured data (JSON-LD -> sameAs) overrides links found in <a> tags."""
+    try:
+        data = json.loads(ld_json)
+        if isinstance(data, dict) and "sameAs" in data:
+            same_as = data["sameAs"]
+            if isinstance(same_as, str):
+                same_as = [same_as]
+            for link in same_as:
+                link_l = link.lower()
+                if "linkedin.com" in link_l:
+                    metadata["linkedin"] = link
+                elif "facebook.com" in link_l:
+                    metadata["facebook"] = link
+                elif "twitter.com" in link_l or "x.com" in link_l:
+                    metadata["twitter"] = link
+                elif "instagram.com" in link_l:
+                    metadata["instagram"] = link
+                elif "youtube.com" in link_l:
+                    metadata["youtube"] = link
+    except Exception:
+        pass
+
+
+def extract_html_metadata_bs4(html, metadata, charset=None):
+    """Fill metadata from a full BeautifulSoup tree of the page."""
+    soup = BeautifulSoup(html, "html.parser", from_encoding=charset if isinstance(html, bytes) else None)
+
+    # --- Basic Metadata ---
+    if soup.title and soup.title.string:
+        metadata["title"] = soup.title.string.strip()
+
+    desc_tag = soup.find("meta", attrs={"name": "description"})
+    if desc_tag and desc_tag.get("content"):
+        metadata["description"] = desc_tag["content"].strip()
+
+    kw_tag = soup.find("meta", attrs={"name": "keywords"})
+    if kw_tag and kw_tag.get("content"):
+        metadata["keywords"] = kw_tag["content"].strip()
+
+    # OpenGraph
+    metadata["og_title"] = (soup.find("meta", property="og:title") or {}).get("content")
+    metadata["og_description"] = (soup.find("meta", property="og:description") or {}).get("content")
+    metadata["og_site_name"] = (soup.find("meta", property="og:site_name") or {}).get("content")
+
+    # Twitter
+    metadata["twitter_title"] = (soup.find("meta", attrs={"name": "twitter:title"}) or {}).get("content")
+    metadata["twitter_description"] = (soup.find("meta", attrs={"name": "twitter:description"}) or {}).get("content")
+
+    # Canonical
+    canon = soup.find("link", rel="canonical")
+    if canon and canon.get("href"):
+        metadata["canonical"] = canon["href"]
+
+    # H1
+    h1 = soup.find("h1")
+    if h1:
+        metadata["h1"] = h1.get_text(strip=True)
+
+    # Language
+    if soup.html and soup.html.has_attr("lang"):
+        metadata["language"] = soup.html["lang"]
 
-def process_record(rec):
-    """Process a single index record and extract metadata."""
-    filename = rec.get("filename")
-    offset = rec.get("offset")
-    page_meta = extract_page_metadata(filename, offset)
+    # --- Social Media Links ---
+    match_social_links((a["href"] for a in soup.find_all("a", href=True)), metadata)
+
+    for script in soup.find_all("script", type="application/ld+json"):
+        if script.string:
+            apply_same_as(script.string, metadata)
+
+
+HEAD_END = re.compile(rb"</head\s*>", re.IGNORECASE)
+TITLE_SOURCE = re.compile(r"<title\b[^>]*>(.*?)</title\s*>", re.IGNORECASE | re.DOTALL)
+CHARSET_PARAM = re.compile(r"charset\s*=\s*[\"']?([\w.:-]+)", re.IGNORECASE)
+
+
+def header_charset(content_type):
+    """Charset named in an HTTP Content-Type header, or None if absent or unknown."""
+    found = CHARSET_PARAM.search(content_type or "")
+    if not found:
+        return None
+    try:
+        return codecs.lookup(found.group(1)).name
+    except LookupError:
+        return None
+
+
+def decode_html(html, charset=None):
+    """
+    Decode page bytes as bs4 would: the header charset, then a <meta>
+    charset, then a guess from the bytes (BOM, detector, utf-8, windows-1252).
+    Errors are replaced, since the fast extractor may cut a character in two.
+    """
+    encoding = charset or EncodingDetector.find_declared_encoding(html, is_html=True)
+    try:
+        return html.decode(codecs.lookup(encoding).name, errors="replace")
+    except (LookupError, TypeError):
+        return UnicodeDammit(html, is_html=True).unicode_markup or html.decode("utf-8", errors="replace")
+
+
+def extract_html_metadata_fast(html, metadata, head_only=None, body_bytes=None, charset=None):
+    """
+    Fill the same fields with selectolax (lexbor), parsing only a prefix of
+    the page: up to </head> when head_only, otherwise the first body_bytes
+    bytes (or the whole head, if longer), so h1, <a> links and JSON-LD past
+    that budget are skipped. The prefix is decoded with decode_html first;
+    lexbor itself assumes utf-8.
+    """
+    head_only = HEAD_ONLY if head_only is None else head_only
+    body_bytes = BODY_SCAN_BYTES if body_bytes is None else body_bytes
+
+    head_end = HEAD_END.search(html)
+    head_limit = head_end.end() if head_end else 0
+    limit = head_limit if head_only and head_end else max(head_limit, body_bytes)
+    source = decode_html(html[:limit], charset)
+    tree = LexborHTMLParser(source)
+
+    def content(selector):
+        node = tree.css_first(selector)
+        return node.attributes.get("content") if node else None
+
+    # --- Basic Metadata ---
+    title = tree.css_first("title")
+    title = title.text() if title else None
+    if title and "<" in title:
+        # lexbor keeps tags inside <title> as text, html.parser parses them;
+        # match bs4's .string, which is None unless the title holds one string
+        raw = TITLE_SOURCE.search(source)
+        title = BeautifulSoup(raw.group(1), "html.parser").string if raw else None
+    if title:
+        metadata["title"] = title.strip()
+
+    for field in ["description", "keywords"]:
+        value = content(f'meta[name="{field}"]')
+        if value:
+            metadata[field] = value.strip()
+
+    # OpenGraph
+    metadata["og_title"] = content('meta[property="og:title"]')
+    metadata["og_description"] = content('meta[property="og:description"]')
+    metadata["og_site_name"] = content('meta[property="og:site_name"]')
+
+    # Twitter
+    metadata["twitter_title"] = content('meta[name="twitter:title"]')
+    metadata["twitter_description"] = content('meta[name="twitter:description"]')
+
+    # Canonical
+    canon = tree.css_first('link[rel~="canonical"]')
+    if canon and canon.attributes.get("href"):
+        metadata["canonical"] = canon.attributes["href"]
+
+    # Language
+    root = tree.css_first("html")
+    if root and "lang" in root.attributes:
+        metadata["language"] = root.attributes["lang"]
+
+    if head_only:
+        return
+
+    # H1
+    h1 = tree.css_first("h1")
+    if h1:
+        metadata["h1"] = h1.text(strip=True)
+
+    # --- Social Media Links ---
+    match_social_links((a.attributes["href"] or "" for a in tree.css("a[href]")), metadata)
+
+    for script in tree.css('script[type="application/ld+json"]'):
+        ld_json = script.text()
+        if ld_json:
+            apply_same_as(ld_json, metadata)
+
+
+HTML_EXTRACTORS = {
+    "bs4": extract_html_metadata_bs4,
+    "fast": extract_html_metadata_fast,
+}
+
+
+
+META_FIELDS = [
+    "title", "description", "keywords", "og_title", "og_description", "og_site_name",
+    "twitter_title", "twitter_description", "canonical", "h1", "language",
+    "linkedin", "facebook", "twitter", "instagram", "youtube",
+]
+
+RESULT_SCHEMA = pa.schema([
+    ("domain", pa.string()),
+    ("url", pa.string()),
+    ("status", pa.int32()),
+    ("mime", pa.string()),
+    ("length", pa.int64()),
+    ("filename", pa.string()),
+    ("offset", pa.int64()),
+    ("digest", pa.string()),
+    ("meta", pa.struct([(field, pa.string()) for field in META_FIELDS])),
+])
+
+
+def write_results(df, path):
+    """
+    Write extracted records to CSV, or to typed Parquet when path ends in .parquet
+    (meta becomes a struct column so readers can project single fields).
+    """
+    if not path.endswith(".parquet"):
+        df.to_csv(path, index=False)
+        return
+
+    df = df.copy()
+    for col in ["status", "length", "offset"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
+    pq.write_table(pa.Table.from_pandas(df, schema=RESULT_SCHEMA, preserve_index=False), path)
+
+
+def record_result(rec, page_meta):
+    """Output row for an index record and its extracted metadata."""
     return {
         "domain": rec.get("domain"),
         "url": rec.get("url"),
         "status": rec.get("status"),
         "mime": rec.get("mime"),
         "length": rec.get("length"),
-        "filename": filename,
-        "offset": offset,
+        "filename": rec.get("filename"),
+        "offset": rec.get("offset"),
         "digest": rec.get("digest"),
         "meta": page_meta,
     }
 
 
+# -------------------
+# Range fetch planning
+# -------------------
+RangeFetch = namedtuple("RangeFetch", ["filename", "start", "end", "records"])
 
 
+def record_length(rec):
+    length = rec.get("length")
+    return int(length) if pd.notna(length) else DEFAULT_RECORD_LENGTH
 
-def main():
-    folder = "folder/of/the/stored/csvs"
-    all_files = glob.glob(os.path.join(folder, "*.csv"))
 
-    if not all_files:
-        raise FileNotFoundError(f"No CSV files found in {folder}")
+def plan_range_fetches(records, max_gap=COALESCE_MAX_GAP, max_span=COALESCE_MAX_SPAN):
+    """
+    Group index records by WARC filename, sort them by offset and merge
+    records no more than max_gap bytes apart into one range of at most
+    max_span bytes (max_span=0 keeps one record per range).
+    Returns RangeFetch(filename, start, end, records) with end exclusive.
+    """
+    by_file = defaultdict(list)
+    for rec in records:
+        by_file[rec["filename"]].append(rec)
+
+    plans = []
+    for filename, recs in by_file.items():
+        recs.sort(key=lambda r: int(r["offset"]))
+        group, start, end = [], 0, 0
+        for rec in recs:
+            offset = int(rec["offset"])
+            rec_end = offset + record_length(rec)
+            if group and offset - end <= max_gap and max(end, rec_end) - start <= max_span:
+                group.append(rec)
+                end = max(end, rec_end)
+                continue
+            if group:
+                plans.append(RangeFetch(filename, start, end, group))
+            group, start, end = [rec], offset, rec_end
+        if group:
+            plans.append(RangeFetch(filename, start, end, group))
 
-    dfs = [pd.read_csv(f) for f in all_files]
-    full_df = pd.concat(dfs, ignore_index=True)
+    return plans
 
-    # full_df.to_csv('all_pages_combine.csv', index=False)
 
+def split_range_payload(plan, payload):
+    """Yield (record, bytes) for each record of a fetched RangeFetch."""
+    for rec in plan.records:
+        begin = int(rec["offset"]) - plan.start
+        yield rec, payload[begin:begin + record_length(rec)]
 
-    # Extract domain vectorized
-    full_df["domain"] = (
-        full_df["url"]
-        .dropna()
-        .map(lambda x: urlparse(str(x)).netloc.lower() if pd.notna(x) else None)
-    )
 
-    # Keep only .au domains
-    au_df = full_df[full_df["domain"].str.endswith(".au", na=False)]
+def fetch_range_payloads(plan):
+    """
+    Fetch one (possibly merged) range; returns [(record, bytes)] for every
+    record in it, or [] when the fetch fails. Failed records never reach the
+    writer, so they are not checkpointed and the next run retries them.
+    """
+    try:
+        payload = fetch_warc_record(plan.filename, plan.start, plan.end - plan.start).read()
+    except Exception as e:
+        print(f"Error fetching {plan.filename} [{plan.start}, {plan.end}), "
+              f"{len(plan.records)} records left for retry: {e}")
+        return []
+    return list(split_range_payload(plan, payload))
+
 
-    # Deduplicate: keep only first occurrence per domain
-    filtered_df = au_df.drop_duplicates(subset="domain", keep="first")
+def parse_record_payload(rec, payload):
+    """Parse stage: output row for a record from its raw WARC bytes (runs in a worker process)."""
+    return record_result(rec, extract_warc_metadata(io.BytesIO(payload)))
 
 
-    results = []
-    filtered = filtered_df.to_dict("records")[:100]
-    
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {executor.submit(process_record, rec): rec for rec in filtered}
-        for future in tqdm(as_completed(futures), total=len(futures), desc="Extracting from WARC"):
+def process_records_threaded(plans, sink, fetch_workers=MAX_WORKERS, parse_workers=PARSE_WORKERS,
+                             queue_size=PARSE_QUEUE_SIZE):
+    """
+    Two-stage pipeline: a thread pool fetches ranges, a process pool parses them,
+    and every output row is handed to sink as soon as it is parsed.
+    New fetches are only submitted while fewer than queue_size records are
+    waiting to be parsed, so memory stays bounded when parsing is the bottleneck.
+    """
+    pending = iter(plans)
+    fetching, parsing = {}, set()
+
+    with ThreadPoolExecutor(max_workers=fetch_workers) as io_pool, \
+            ProcessPoolExecutor(max_workers=parse_workers) as cpu_pool, \
+            tqdm(total=sum(len(plan.records) for plan in plans), desc="Extracting from WARC") as progress:
+
+        def refill():
+            while len(fetching) < fetch_workers and len(parsing) < queue_size:
+                plan = next(pending, None)
+                if plan is None:
+                    return
+                fetching[io_pool.submit(fetch_range_payloads, plan)] = plan
+
+        refill()
+        while fetching or parsing:
+            done, _ = wait(fetching.keys() | parsing, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in fetching:
+                    plan = fetching.pop(future)
+                    payloads = future.result()
+                    if not payloads:
+                        progress.update(len(plan.records))
+                    for rec, payload in payloads:
+                        parsing.add(cpu_pool.submit(parse_record_payload, rec, payload))
+                    continue
+
+                parsing.discard(future)
+                try:
+                    sink(future.result())
+                except Exception as e:
+                    print(f"Error processing record: {e}")
+                progress.update(1)
+            refill()
+
+
+async def _process_records_async(plans, sink, concurrency, conn_limit, parse_workers, queue_size):
+    """
+    Two-stage pipeline: `concurrency` fetch workers share one pooled keep-alive
+    session (one RangeFetch per request) and feed a bounded queue; the queue
+    is drained into a process pool for parsing. A full queue blocks the
+    fetchers, so memory is bounded by queue_size plus requests in flight.
+    Every output row is handed to sink as soon as it is parsed.
+    """
+    pending = iter(plans)
+    queue = asyncio.Queue(maxsize=queue_size)
+    progress = tqdm(total=sum(len(plan.records) for plan in plans), desc="Extracting from WARC")
+    loop = asyncio.get_running_loop()
+
+    async def fetcher(session):
+        # Fetchers share one iterator, so each range is taken exactly once
+        for plan in pending:
             try:
-                result = future.result()
-                results.append(result)
+                payload = await fetch_warc_record_async(
+                    session, plan.filename, plan.start, plan.end - plan.start
+                )
+            except Exception as e:
+                print(f"Error fetching {plan.filename} [{plan.start}, {plan.end}), "
+                      f"{len(plan.records)} records left for retry: {e}")
+                progress.update(len(plan.records))
+                continue
+            for rec, chunk in split_range_payload(plan, payload):
+                await queue.put((rec, chunk))
+
+    async def parser(pool):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            try:
+                sink(await loop.run_in_executor(pool, parse_record_payload, *item))
             except Exception as e:
                 print(f"Error processing record: {e}")
+            finally:
+                progress.update(1)
+
+    with ProcessPoolExecutor(max_workers=parse_workers) as pool:
+        # Two dispatchers per process keep every core busy
+        parsers = [asyncio.create_task(parser(pool)) for _ in range(2 * parse_workers)]
+
+        connector = aiohttp.TCPConnector(limit=conn_limit, ttl_dns_cache=300)
+        # No total timeout: it would also count time spent queued for one of conn_limit connections
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=ASYNC_CONNECT_TIMEOUT, sock_read=ASYNC_READ_TIMEOUT)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            await asyncio.gather(*(fetcher(session) for _ in range(min(concurrency, len(plans)) or 1)))
+
+        for _ in parsers:
+            await queue.put(None)
+        await asyncio.gather(*parsers)
+
+    progress.close()
+
+
+def process_records_async(plans, sink, concurrency=ASYNC_CONCURRENCY, conn_limit=ASYNC_CONN_LIMIT,
+                          parse_workers=PARSE_WORKERS, queue_size=PARSE_QUEUE_SIZE):
+    """Fetch planned ranges with the asyncio fetcher and parse them in a process pool."""
+    asyncio.run(_process_records_async(plans, sink, concurrency, conn_limit, parse_workers, queue_size))
+
+
+# -------------------
+# Streaming, resumable output
+# -------------------
+class ShardedResultWriter:
+    """
+    Stream result rows to rolling shards (part-NNNNN.parquet / .csv) in
+    output_dir. Each shard is written to a hidden temp file and renamed into
+    place, so a shard is either complete or absent. The published shards are
+    the checkpoint (see load_checkpoint): a crash loses only the rows still
+    buffered, and a restart refetches just those.
+    """
+
+    def __init__(self, output_dir, fmt=OUTPUT_FORMAT, rows_per_shard=ROWS_PER_SHARD):
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.rows_per_shard = rows_per_shard
+        # Continue numbering after the shards of a previous run
+        self.shard_num = len(glob.glob(os.path.join(output_dir, f"part-*.{fmt}")))
+        self.buffer = []
+        self.count = 0
+
+    def write(self, result):
+        self.buffer.append(result)
+        if len(self.buffer) >= self.rows_per_shard:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+
+        name = f"part-{self.shard_num:05d}.{self.fmt}"
+        tmp_path = os.path.join(self.output_dir, f".{name}")
+        write_results(pd.DataFrame(self.buffer, columns=RESULT_SCHEMA.names), tmp_path)
+        os.replace(tmp_path, os.path.join(self.output_dir, name))
+
+        self.count += len(self.buffer)
+        self.shard_num += 1
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_checkpoint(output_dir):
+    """
+    Return the set of (filename, offset) keys already written to output_dir,
+    read back from its published shards (only two columns of each).
+    """
+    keys = set()
+    for path in sorted(glob.glob(os.path.join(output_dir, "part-*"))):
+        if path.endswith(".parquet"):
+            df = pd.read_parquet(path, columns=["filename", "offset"])
+        else:
+            df = pd.read_csv(path, usecols=["filename", "offset"])
+        df = df.dropna()
+        keys.update(zip(df["filename"], df["offset"].astype("int64")))
+    return keys
+
+
+# -------------------
+# Streaming .au pre-filter
+# -------------------
+# scheme://[userinfo@]host[:port]/...
+HOST_PATTERN = r"^[A-Za-z][A-Za-z0-9+.-]*://(?:[^@/?#]*@)?([^/:?#]+)"
+
+
+def iter_au_records(page_files, max_records=None, chunksize=PAGE_CHUNK_SIZE):
+    """
+    Stream index page files chunk by chunk and yield the first record of
+    every .au domain. Hosts come from the index's domain/url_host_name
+    column when present, otherwise from the URL with vectorized string ops.
+    Domains already kept are remembered as 64-bit hashes, so the pages are
+    never concatenated into one frame.
+    """
+    seen = set()
+    kept = 0
+    for path in page_files:
+        for chunk in pd.read_json(path, lines=True, dtype=False, chunksize=chunksize):
+            if "domain" in chunk:
+                domain = chunk["domain"]
+            elif "url_host_name" in chunk:
+                domain = chunk["url_host_name"]
+            else:
+                domain = chunk["url"].str.extract(HOST_PATTERN, expand=False)
+            chunk = chunk.assign(domain=domain.str.lower())
+
+            # Keep only .au domains, first occurrence per domain within the chunk
+            chunk = chunk[chunk["domain"].str.endswith(".au", na=False)]
+            chunk = chunk.drop_duplicates(subset="domain", keep="first")
+
+            # ... and across chunks
+            hashes = pd.util.hash_pandas_object(chunk["domain"], index=False).tolist()
+            is_new = [h not in seen for h in hashes]
+            seen.update(hashes)
+
+            for rec in chunk.loc[is_new].to_dict("records"):
+                yield rec
+                kept += 1
+                if max_records is not None and kept >= max_records:
+                    return
+
+
+def main():
+    folder = "folder/of/the/stored/pages"
+    all_files = sorted(glob.glob(os.path.join(folder, "*.jsonl")))
+
+    if not all_files:
+        raise FileNotFoundError(f"No JSONL page files found in {folder}")
+
+    filtered = list(iter_au_records(all_files, max_records=MAX_RECORDS))
+    print(f"Kept {len(filtered)} unique .au domains from {len(all_files)} index pages")
+
+    # Resume: skip records whose results were already written by a previous run
+    completed = load_checkpoint(OUTPUT_DIR)
+    if completed:
+        before = len(filtered)
+        filtered = [rec for rec in filtered if (rec["filename"], int(rec["offset"])) not in completed]
+        print(f"Skipping {before - len(filtered)} records completed by a previous run")
+
+    if COALESCE_RANGES:
+        plans = plan_range_fetches(filtered)
+    else:
+        plans = plan_range_fetches(filtered, max_span=0)
+    print(f"Planned {len(plans)} range requests for {len(filtered)} records")
+
+    with ShardedResultWriter(OUTPUT_DIR) as writer:
+        if FETCH_MODE == "async":
+            process_records_async(plans, writer.write)
+        else:
+            process_records_threaded(plans, writer.write)
 
-    df = pd.DataFrame(results)
-    df.to_csv(OUTPUT_CSV, index=False)
-    print(f"Saved results to {OUTPUT_CSV}")
+    print(f"Saved {writer.count} results to {OUTPUT_DIR}")
 
-    return df
+    return writer.count
 
 if __name__ == "__main__":
-    df = main()
+    main()
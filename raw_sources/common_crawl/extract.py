@@ -1,76 +1,174 @@
 import requests
 import json
-import csv
 import os
-import pandas as pd
+import glob
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 CC_INDEX_BASE = "https://index.commoncrawl.org/CC-MAIN-2024-38-index" # Example, you should use the latest index.
+OUTPUT_DIR = "common_crawl_pages"
+MANIFEST_FILE = "_manifest.json"  # page numbers already saved (and for which query), so reruns only fetch the rest
+MAX_PAGES = 500      # cap on pages fetched (None for every page)
+PAGE_WORKERS = 4     # concurrent page downloads; the index server throttles aggressive clients
+MAX_RETRIES = 5      # per page, with exponential backoff
+RETRY_STATUSES = (429, 500, 502, 503, 504)
 
-def fetch_all_index_records(url_pattern: str, start_page: int = 0):
-    """
-    Fetches all records for a given URL pattern from the Common Crawl
-    index server, handling pagination automatically and saving each page
-    to a separate CSV file. Allows starting the fetch from a specific page.
-    """
-    
-    # Create the directory to save the CSV files
-    output_dir = "common_crawl_pages"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
 
-    # --- 1. Get the total number of pages to determine the scope of the fetch ---
+def fetch_page_count(session, url_pattern):
+    """Ask the index server how many pages the URL pattern spans."""
     initial_params = {
         'url': url_pattern,
         'output': 'json',
         'showNumPages': 'true'
     }
-    
+
     print(f"Fetching page count for {url_pattern}...")
     try:
-        response = requests.get(CC_INDEX_BASE, params=initial_params, stream=True)
+        response = session.get(CC_INDEX_BASE, params=initial_params, timeout=60)
         response.raise_for_status()
-        
-        # The first response is a single line with page count info
-        page_info = json.loads(next(response.iter_lines()).decode('utf-8'))
+
+        # The response is a single line with page count info
+        page_info = json.loads(response.text.splitlines()[0])
         total_pages = page_info.get('pages', 1)
         print(f"Total pages to retrieve: {total_pages}\n")
-
-        # Limit to 100 pages to avoid overwhelming the server for testing purposes
-        total_pages = min(500, total_pages)
-    except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+        return total_pages
+    except (requests.exceptions.RequestException, json.JSONDecodeError, IndexError) as e:
         print(f"Error fetching page count: {e}. Assuming single page.")
-        total_pages = 1
-
-    # --- 2. Iterate through each page and save records as CSV ---
-    # The loop now starts from the 'start_page' provided by the user
-    for page_num in range(start_page, total_pages):
-        print(f"Fetching page {page_num + 1} of {total_pages}...")
-        
-        # Parameters for the actual data retrieval
-        params = {
-            'url': url_pattern,
-            'output': 'json',
-            'page': page_num
-        }
-            
+        return 1
+
+
+def manifest_key(url_pattern, total_pages):
+    """
+    What the saved page numbers refer to. Another pattern, index or page
+    count numbers the pages differently, so their pages can't be reused.
+    """
+    return {"url_pattern": url_pattern, "index": CC_INDEX_BASE, "total_pages": total_pages}
+
+
+def load_manifest(output_dir, key):
+    """
+    Return the set of page numbers already saved in output_dir for key.
+    A manifest written for another key is reset: its page files are removed
+    so the output never mixes two queries.
+    """
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    saved_key = {field: manifest.get(field) for field in key}
+    if saved_key == key:
+        return set(manifest["completed_pages"])
+
+    changed = ", ".join(
+        f"{field} {saved_key[field]!r} -> {key[field]!r}" for field in key if saved_key[field] != key[field]
+    )
+    pages = glob.glob(os.path.join(output_dir, "page_*.jsonl"))
+    print(f"Manifest in {output_dir} is for another query ({changed}), "
+          f"removing its {len(pages)} page files and starting over")
+    for page in pages:
+        os.remove(page)
+    os.remove(path)
+    return set()
+
+
+def save_manifest(output_dir, key, completed):
+    """Atomically rewrite the manifest of saved page numbers."""
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump({**key, "completed_pages": sorted(completed)}, f)
+    os.replace(path + ".tmp", path)
+
+
+def fetch_index_page(session, url_pattern, page_num, output_dir, retries=MAX_RETRIES):
+    """
+    Stream one index page's JSON lines straight to page_<n>.jsonl.
+    Retries throttling, server errors and connection errors with backoff;
+    the file only appears once the whole page has been written.
+    Returns the number of records saved.
+    """
+    params = {
+        'url': url_pattern,
+        'output': 'json',
+        'page': page_num
+    }
+    jsonl_filename = os.path.join(output_dir, f"page_{page_num + 1}.jsonl")
+    tmp_filename = jsonl_filename + ".tmp"
+
+    for attempt in range(retries + 1):
         try:
-            resp = requests.get(CC_INDEX_BASE, params=params, stream=True)
-            resp.raise_for_status()
+            with session.get(CC_INDEX_BASE, params=params, stream=True, timeout=120) as resp:
+                if resp.status_code not in RETRY_STATUSES:
+                    resp.raise_for_status()
+
+                    count = 0
+                    with open(tmp_filename, 'wb') as f:
+                        for line in resp.iter_lines():
+                            if line:
+                                f.write(line + b"\n")
+                                count += 1
+                    os.replace(tmp_filename, jsonl_filename)
+                    return count
+
+                error = f"HTTP {resp.status_code}"
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError) as e:
+            error = e
+
+        if attempt == retries:
+            raise requests.exceptions.RetryError(f"page {page_num + 1} failed after {retries} retries: {error}")
+        delay = min(60, 2 ** attempt) + random.uniform(0, 1)
+        print(f"Retrying page {page_num + 1} in {delay:.1f}s: {error}")
+        time.sleep(delay)
 
-            # Create a DataFrame directly from the list of dictionaries
-            records_df = pd.DataFrame([json.loads(line) for line in resp.iter_lines() if line])
 
-            if not records_df.empty:
-                # Define the CSV file path for the current page
-                csv_filename = os.path.join(output_dir, f"page_{page_num + 1}.csv")
-                
-                # Use pandas to save the DataFrame to a CSV
-                records_df.to_csv(csv_filename, index=False)
-                print(f"Page {page_num + 1} saved to {csv_filename}")
+def fetch_all_index_records(url_pattern: str, output_dir: str = OUTPUT_DIR,
+                            max_pages=MAX_PAGES, workers: int = PAGE_WORKERS):
+    """
+    Fetches all records for a given URL pattern from the Common Crawl
+    index server with up to `workers` pages in flight, saving each page
+    to a separate JSON lines file. Completed pages are recorded in a
+    manifest, so a rerun only fetches pages that are missing or failed.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    session = requests.Session()
+    session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=workers))
+
+    total_pages = fetch_page_count(session, url_pattern)
+    key = manifest_key(url_pattern, total_pages)
+    if max_pages is not None:
+        total_pages = min(max_pages, total_pages)
+
+    completed = load_manifest(output_dir, key)
+    todo = [page_num for page_num in range(total_pages) if page_num not in completed]
+    print(f"{len(completed)} pages already saved, fetching {len(todo)} of {total_pages}")
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(fetch_index_page, session, url_pattern, page_num, output_dir): page_num
+            for page_num in todo
+        }
+        for future in as_completed(futures):
+            page_num = futures[future]
+            try:
+                count = future.result()
+            except (requests.exceptions.RequestException, OSError) as e:
+                print(f"Error fetching page {page_num + 1}: {e}")
+                failed.append(page_num)
+                continue
+
+            completed.add(page_num)
+            save_manifest(output_dir, key, completed)
+            print(f"Page {page_num + 1} saved ({count} records), {len(completed)}/{total_pages} done")
 
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching page {page_num}: {e}")
-            continue
+    if failed:
+        print(f"{len(failed)} pages failed, rerun to retry: {sorted(p + 1 for p in failed)}")
+    return sorted(failed)
 
 
-fetch_all_index_records("*.au/", start_page=479)
\ No newline at end of file
+if __name__ == "__main__":
+    fetch_all_index_records("*.au/")
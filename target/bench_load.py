@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+import psycopg2
+from load_postgres import DB_CONFIG, CHUNK_SIZE, load_entities_copy, load_entities_values
+
+# -------------------
+# Benchmark the entity loaders on synthetic ABR rows.
+#
+#   python bench_load.py [rows] [postgres dsn]
+#
+# Each mode loads into fresh tables in a scratch schema (dropped at the
+# end), so any local Postgres will do, including a throwaway one such as
+# pgserver or `initdb` + `pg_ctl start`.
+# -------------------
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "postgres_table_schemas")
+BENCH_SCHEMA = "bench_load"
+
+
+def synthetic_entities(rows, seed=0):
+    """ABR-shaped rows as the CSV intermediate holds them (all text)."""
+    rng = np.random.default_rng(seed)
+    abns = 10**10 + rng.permutation(rows) * 7919
+    words = np.array(["smith", "jones", "acme", "plumbing", "electrical", "holdings", "bikes", "cafe"])
+    names = [" ".join(rng.choice(words, 3)) + " PTY LTD" for _ in range(rows)]
+    trading = [
+        "; ".join(" ".join(rng.choice(words, 2)) for _ in range(k)) if k else None
+        for k in rng.integers(0, 4, size=rows)
+    ]
+    return pd.DataFrame({
+        "ABN": abns.astype(str),
+        "ABN_Status": "ACT",
+        "ABN_Status_From": "20200101",
+        "Entity_Type_Code": "PRV",
+        "Entity_Type": "Australian Private Company",
+        "Entity_Name": names,
+        "Trading_Names": trading,
+        "ASIC_Number": rng.integers(10**7, 10**9, size=rows).astype(str),
+        "GST_Status": "ACT",
+        "GST_From": "20200701",
+        "State": "NSW",
+        "Postcode": "0800",
+        "Record_Last_Updated": "20250301",
+    })
+
+
+def create_tables(cur):
+    """Create au_entities and au_entity_trading_names in a fresh scratch schema."""
+    cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+    cur.execute(f"SET search_path TO {BENCH_SCHEMA}, public")
+    cur.execute("SELECT count(*) FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    has_trgm = cur.fetchone()[0] > 0
+
+    for name in ["au_entities.sql", "au_entity_trading_names.sql"]:
+        with open(os.path.join(SCHEMA_DIR, name), encoding="utf-8") as f:
+            for statement in f.read().split(";"):
+                if not statement.strip():
+                    continue
+                if ("pg_trgm" in statement or "gin_trgm_ops" in statement) and not has_trgm:
+                    continue
+                cur.execute(statement)
+    if not has_trgm:
+        print("pg_trgm not available, trigram indexes skipped")
+
+
+def main(rows, dsn):
+    df = synthetic_entities(rows)
+    chunks = [df.iloc[i:i + CHUNK_SIZE] for i in range(0, len(df), CHUNK_SIZE)]
+    conn = psycopg2.connect(dsn) if dsn else psycopg2.connect(**DB_CONFIG)
+    cur = conn.cursor()
+
+    timings = {}
+    for name, load in [("values", load_entities_values), ("copy", load_entities_copy)]:
+        create_tables(cur)
+        conn.commit()
+        start = time.perf_counter()
+        load(cur, chunks)
+        conn.commit()
+        timings[name] = time.perf_counter() - start
+
+        cur.execute("SELECT count(*) FROM au_entities")
+        entities = cur.fetchone()[0]
+        cur.execute("SELECT count(*) FROM au_entity_trading_names")
+        trading = cur.fetchone()[0]
+        print(f"{name:>6}: {timings[name]:.2f}s, {rows / timings[name]:,.0f} rows/s "
+              f"({entities} entities, {trading} trading names)")
+    print(f"speedup: {timings['values'] / timings['copy']:.1f}x")
+
+    cur.execute(f"DROP SCHEMA {BENCH_SCHEMA} CASCADE")
+    conn.commit()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000, sys.argv[2] if len(sys.argv) > 2 else None)
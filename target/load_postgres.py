@@ -1,7 +1,15 @@
+import io
+import os
+import re
+import time
 import boto3
 import pandas as pd
-import psycopg2
+import pyarrow.parquet as pq
+from pyarrow import fs
+from psycopg2 import errors
 from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import json
 from datetime import datetime
 
@@ -9,9 +17,42 @@ from datetime import datetime
 # Config
 # -------------------------
 S3_BUCKET = "your-bucket-name"
-ENTITIES_KEY = "entities.csv"
+ENTITIES_KEY = "entities.csv"      # .csv or .parquet
 DOMAINS_KEY = "domains.csv"
 SCORED_KEY = "scored_links.csv"
+# Incremental runs load abr_bulk_process's delta of new/updated entities and
+# domain_match's new/changed pages instead, and SCORED_KEY then holds
+# domain_match's incremental output (changed rows only)
+INCREMENTAL = False
+ENTITIES_DELTA_KEY = "entities_delta.csv"
+DOMAINS_DELTA_KEY = "domains_delta.csv"
+CHUNK_SIZE = 50000
+
+# "copy":   COPY each chunk into an unlogged staging table, then one set-based merge
+# "values": execute_values upserts per chunk
+LOAD_MODE = "copy"
+LOAD_WORKERS = 4        # connections loading chunks of the same table in parallel
+MAX_RETRIES = 3         # per chunk, when workers deadlock on the same rows
+PROGRESS_TABLE = "load_progress"   # chunks already committed, so a rerun resumes
+BULK_LOAD_MARKER = "bulk_load:in_progress"   # PROGRESS_TABLE source set while a bulk load is unfinished
+
+# Full rebuild: recreate the tables, load them without secondary indexes,
+# then build indexes, CLUSTER and ANALYZE. False keeps the incremental upserts.
+BULK_LOAD = False
+INDEX_MEMORY = "1GB"    # maintenance_work_mem per index build
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "postgres_table_schemas")
+# Columns added since the tables were first created; applied to existing tables before loading
+SCHEMA_UPGRADES = [
+    "ALTER TABLE IF EXISTS au_entity_domains ADD COLUMN IF NOT EXISTS match_score REAL",
+]
+# table -> schema file, in FK order
+SCHEMA_FILES = {
+    "au_entities": "au_entities.sql",
+    "au_entity_trading_names": "au_entity_trading_names.sql",
+    "au_entity_domains": "au_entity_domains.sql",
+    "au_domain_metadata": "au_domain_metadata.sql",
+    "au_entity_social_links": "au_entity_social_links.sql",
+}
 
 DB_CONFIG = {
     "dbname": "mydb",
@@ -22,169 +63,583 @@ DB_CONFIG = {
 }
 
 # -------------------------
-# Connect to Postgres
+# Initialize S3 client
 # -------------------------
-conn = psycopg2.connect(**DB_CONFIG)
-cur = conn.cursor()
+s3 = boto3.client("s3")
+s3_fs = fs.S3FileSystem()
 
 # -------------------------
-# Initialize S3 client
+# Helper to read CSV or Parquet in chunks, only the needed columns
 # -------------------------
-s3 = boto3.client("s3")
+def read_table_s3(bucket, key, columns=None, chunksize=CHUNK_SIZE, dtype=None):
+    if not key.endswith(".parquet"):
+        obj = s3.get_object(Bucket=bucket, Key=key)
+        return pd.read_csv(obj['Body'], chunksize=chunksize, usecols=columns, dtype=dtype)
+
+    parquet_file = pq.ParquetFile(s3_fs.open_input_file(f"{bucket}/{key}"))
+    return (
+        batch.to_pandas()
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns)
+    )
+
+# meta is a struct (dict) in Parquet and a stringified dict in CSV
+def parse_meta(value):
+    if isinstance(value, dict):
+        return value
+    return json.loads(value.replace("'", '"')) if pd.notna(value) else {}
 
 # -------------------------
-# Helper to read CSV in chunks
+# Helper to stream a DataFrame through COPY
 # -------------------------
-def read_csv_s3(bucket, key, chunksize=50000):
-    obj = s3.get_object(Bucket=bucket, Key=key)
-    return pd.read_csv(obj['Body'], chunksize=chunksize)
+def copy_frame(cur, df, table):
+    """
+    COPY df into table (columns named as in df) as CSV from an in-memory
+    buffer. Missing values are sent as \\N so empty strings stay empty.
+    """
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False, na_rep="\\N")
+    buf.seek(0)
+    cur.copy_expert(
+        f"COPY {table} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+        buf
+    )
 
 # -------------------------
 # 1️⃣ Load au_entities + trading_names
 # -------------------------
-for chunk in read_csv_s3(S3_BUCKET, ENTITIES_KEY):
-    # Entities
-    entities_tuples = [
-        (
-            int(row["ABN"]),
-            row["Entity_Name"],
-            row["Entity_Type"],
-            row["Entity_Type_Code"],
-            row["ABN_Status"],
-            row["ABN_Status_From"] if pd.notna(row["ABN_Status_From"]) else None,
-            int(row["ASIC_Number"]) if pd.notna(row["ASIC_Number"]) else None,
-            row["GST_Status"],
-            row["GST_From"] if pd.notna(row["GST_From"]) else None,
-            row["State"],
-            row["Postcode"],
-            row["Record_Last_Updated"] if pd.notna(row["Record_Last_Updated"]) else datetime.now()
+# ABR column -> au_entities column
+ENTITY_COLUMNS = {
+    "ABN": "abn",
+    "Entity_Name": "entity_name",
+    "Entity_Type": "entity_type",
+    "Entity_Type_Code": "entity_type_code",
+    "ABN_Status": "abn_status",
+    "ABN_Status_From": "abn_status_from",
+    "ASIC_Number": "asic_number",
+    "GST_Status": "gst_status",
+    "GST_From": "gst_from",
+    "State": "state",
+    "Postcode": "postcode",
+    "Record_Last_Updated": "record_last_updated",
+}
+
+def load_entities_values(cur, chunks):
+    for chunk in chunks:
+        # Entities
+        entities_tuples = [
+            (
+                int(row["ABN"]),
+                row["Entity_Name"],
+                row["Entity_Type"],
+                row["Entity_Type_Code"],
+                row["ABN_Status"],
+                row["ABN_Status_From"] if pd.notna(row["ABN_Status_From"]) else None,
+                int(row["ASIC_Number"]) if pd.notna(row["ASIC_Number"]) else None,
+                row["GST_Status"],
+                row["GST_From"] if pd.notna(row["GST_From"]) else None,
+                row["State"],
+                row["Postcode"],
+                row["Record_Last_Updated"] if pd.notna(row["Record_Last_Updated"]) else datetime.now()
+            )
+            for _, row in chunk.iterrows()
+        ]
+
+        execute_values(cur, """
+            INSERT INTO au_entities(
+                abn, entity_name, entity_type, entity_type_code, abn_status, abn_status_from,
+                asic_number, gst_status, gst_from, state, postcode, record_last_updated
+            )
+            VALUES %s
+            ON CONFLICT (abn) DO UPDATE SET
+                entity_name = EXCLUDED.entity_name,
+                record_last_updated = now()
+        """, entities_tuples)
+
+        # Trading names
+        trading_tuples = []
+        for _, row in chunk.iterrows():
+            if pd.notna(row["Trading_Names"]):
+                for tn in str(row["Trading_Names"]).split(";"):
+                    trading_tuples.append((int(row["ABN"]), tn.strip()))
+        if trading_tuples:
+            execute_values(cur, """
+                INSERT INTO au_entity_trading_names (abn, trading_name)
+                VALUES %s
+                ON CONFLICT DO NOTHING
+            """, trading_tuples)
+
+
+def load_entities_copy(cur, chunks):
+    """
+    COPY every chunk into the stage_au_entities temp table (per session,
+    not WAL-logged), then merge it into au_entities and
+    au_entity_trading_names with one INSERT ... ON CONFLICT each.
+    Postgres parses the raw values into the column types, so no Python
+    tuples are built.
+    """
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS stage_au_entities (
+            LIKE au_entities INCLUDING DEFAULTS,
+            trading_names TEXT
         )
-        for _, row in chunk.iterrows()
-    ]
+    """)
+    cur.execute("TRUNCATE stage_au_entities")
 
-    execute_values(cur, """
+    staged = 0
+    for chunk in chunks:
+        df = chunk.rename(columns={**ENTITY_COLUMNS, "Trading_Names": "trading_names"})
+        df = df[list(ENTITY_COLUMNS.values()) + ["trading_names"]].dropna(subset=["abn"])
+        if df["abn"].dtype.kind == "f":
+            # int64 Parquet columns with nulls come back as float
+            df["abn"] = df["abn"].astype("int64")
+        copy_frame(cur, df, "stage_au_entities")
+        staged += len(df)
+
+    # An ABN repeated in the input keeps its most recently updated record
+    cur.execute("""
         INSERT INTO au_entities(
             abn, entity_name, entity_type, entity_type_code, abn_status, abn_status_from,
             asic_number, gst_status, gst_from, state, postcode, record_last_updated
         )
-        VALUES %s
+        SELECT DISTINCT ON (abn)
+            abn, entity_name, entity_type, entity_type_code, abn_status, abn_status_from,
+            asic_number, gst_status, gst_from, state, postcode,
+            COALESCE(record_last_updated, now())
+        FROM stage_au_entities
+        ORDER BY abn, record_last_updated DESC NULLS LAST
         ON CONFLICT (abn) DO UPDATE SET
-            entity_name = EXCLUDED.entity_name,
+            (entity_name, entity_type, entity_type_code, abn_status, abn_status_from,
+             asic_number, gst_status, gst_from, state, postcode) =
+            (EXCLUDED.entity_name, EXCLUDED.entity_type, EXCLUDED.entity_type_code,
+             EXCLUDED.abn_status, EXCLUDED.abn_status_from, EXCLUDED.asic_number,
+             EXCLUDED.gst_status, EXCLUDED.gst_from, EXCLUDED.state, EXCLUDED.postcode),
             record_last_updated = now()
-    """, entities_tuples)
-
-    # Trading names
-    trading_tuples = []
-    for _, row in chunk.iterrows():
-        if pd.notna(row["Trading_Names"]):
-            for tn in str(row["Trading_Names"]).split(";"):
-                trading_tuples.append((int(row["ABN"]), tn.strip()))
-    if trading_tuples:
-        execute_values(cur, """
-            INSERT INTO au_entity_trading_names (abn, trading_name)
-            VALUES %s
-            ON CONFLICT DO NOTHING
-        """, trading_tuples)
+        -- Unchanged entities are not rewritten
+        WHERE (au_entities.entity_name, au_entities.entity_type, au_entities.entity_type_code,
+               au_entities.abn_status, au_entities.abn_status_from, au_entities.asic_number,
+               au_entities.gst_status, au_entities.gst_from, au_entities.state, au_entities.postcode)
+            IS DISTINCT FROM
+              (EXCLUDED.entity_name, EXCLUDED.entity_type, EXCLUDED.entity_type_code,
+               EXCLUDED.abn_status, EXCLUDED.abn_status_from, EXCLUDED.asic_number,
+               EXCLUDED.gst_status, EXCLUDED.gst_from, EXCLUDED.state, EXCLUDED.postcode)
+    """)
 
-conn.commit()
+    # Trading names come from the same most recently updated record per ABN
+    cur.execute("""
+        INSERT INTO au_entity_trading_names (abn, trading_name)
+        SELECT DISTINCT s.abn, btrim(t.name)
+        FROM (
+            SELECT DISTINCT ON (abn) abn, trading_names
+            FROM stage_au_entities
+            ORDER BY abn, record_last_updated DESC NULLS LAST
+        ) s
+        CROSS JOIN LATERAL unnest(string_to_array(s.trading_names, ';')) AS t(name)
+        WHERE btrim(t.name) <> ''
+        ON CONFLICT (abn, trading_name) DO NOTHING
+    """)
+
+    cur.execute("TRUNCATE stage_au_entities")
+    return staged
 
 # -------------------------
 # 2️⃣ Load au_entity_domains + metadata + social_links
 # -------------------------
-for chunk in read_csv_s3(S3_BUCKET, DOMAINS_KEY):
-    # Domains
-    domain_tuples = [(row["domain"], int(row["abn"]), datetime.now()) for _, row in chunk.iterrows()]
-    execute_values(cur, """
+def upsert_domains(cur, chunk):
+    """
+    Upsert the chunk's domains and return {domain: id} built from the
+    RETURNING rows, so only this chunk's domains are read back.
+    A domain repeated in the chunk keeps its last ABN.
+    """
+    domains = chunk.drop_duplicates("domain", keep="last")
+    domain_tuples = [
+        (domain, int(abn), datetime.now()) for domain, abn in zip(domains["domain"], domains["abn"])
+    ]
+    rows = execute_values(cur, """
         INSERT INTO au_entity_domains(domain, abn, record_last_updated)
         VALUES %s
         ON CONFLICT (domain) DO UPDATE SET
             abn = EXCLUDED.abn,
             record_last_updated = now()
         RETURNING id, domain
-    """, domain_tuples)
-
-    # Map domain -> domain_id
-    cur.execute("SELECT id, domain FROM au_entity_domains")
-    domain_map = {row[1]: row[0] for row in cur.fetchall()}
-
-    # Metadata
-    metadata_tuples = []
-    social_tuples = []
-    for _, row in chunk.iterrows():
-        domain_id = domain_map[row["domain"]]
-        meta = json.loads(row["meta"].replace("'", '"')) if pd.notna(row["meta"]) else {}
-
-        metadata_tuples.append((
-            domain_id,
-            row["url"],
-            meta.get("title"),
-            meta.get("description"),
-            meta.get("keywords"),
-            meta.get("og_title"),
-            meta.get("og_description"),
-            meta.get("og_site_name"),
-            meta.get("twitter_title"),
-            meta.get("twitter_description"),
-            meta.get("canonical"),
-            meta.get("h1"),
-            meta.get("language"),
-            datetime.now()
-        ))
-
-        # Social links
-        for platform in ["linkedin", "facebook", "twitter", "instagram", "youtube"]:
-            if meta.get(platform):
-                social_tuples.append((domain_id, platform, meta[platform], datetime.now()))
-
-    if metadata_tuples:
-        execute_values(cur, """
-            INSERT INTO au_domain_metadata(
-                domain_id, url, title, description, keywords, og_title,
-                og_description, og_site_name, twitter_title, twitter_description,
-                canonical, h1, language, record_last_updated
-            )
-            VALUES %s
-            ON CONFLICT (domain_id, url) DO UPDATE SET
-                record_last_updated = now()
-        """, metadata_tuples)
+    """, domain_tuples, page_size=len(domain_tuples) or 1, fetch=True)
+    return {domain: domain_id for domain_id, domain in rows}
 
-    if social_tuples:
-        execute_values(cur, """
-            INSERT INTO au_entity_social_links(domain_id, platform, url, record_last_updated)
-            VALUES %s
-            ON CONFLICT (domain_id, platform) DO UPDATE SET
-                url = EXCLUDED.url,
-                record_last_updated = now()
-        """, social_tuples)
 
-conn.commit()
+def load_domains(cur, chunks):
+    for chunk in chunks:
+        # Domains; the upsert returns the id of every domain in the chunk
+        domain_map = upsert_domains(cur, chunk)
+
+        # Metadata
+        metadata_tuples = []
+        social_tuples = []
+        for _, row in chunk.iterrows():
+            domain_id = domain_map[row["domain"]]
+            meta = parse_meta(row["meta"])
+
+            metadata_tuples.append((
+                domain_id,
+                row["url"],
+                meta.get("title"),
+                meta.get("description"),
+                meta.get("keywords"),
+                meta.get("og_title"),
+                meta.get("og_description"),
+                meta.get("og_site_name"),
+                meta.get("twitter_title"),
+                meta.get("twitter_description"),
+                meta.get("canonical"),
+                meta.get("h1"),
+                meta.get("language"),
+                datetime.now()
+            ))
+
+            # Social links
+            for platform in ["linkedin", "facebook", "twitter", "instagram", "youtube"]:
+                if meta.get(platform):
+                    social_tuples.append((domain_id, platform, meta[platform], datetime.now()))
+
+        if metadata_tuples:
+            execute_values(cur, """
+                INSERT INTO au_domain_metadata(
+                    domain_id, url, title, description, keywords, og_title,
+                    og_description, og_site_name, twitter_title, twitter_description,
+                    canonical, h1, language, record_last_updated
+                )
+                VALUES %s
+                ON CONFLICT (domain_id, url) DO UPDATE SET
+                    (title, description, keywords, og_title, og_description, og_site_name,
+                     twitter_title, twitter_description, canonical, h1, language) =
+                    (EXCLUDED.title, EXCLUDED.description, EXCLUDED.keywords, EXCLUDED.og_title,
+                     EXCLUDED.og_description, EXCLUDED.og_site_name, EXCLUDED.twitter_title,
+                     EXCLUDED.twitter_description, EXCLUDED.canonical, EXCLUDED.h1, EXCLUDED.language),
+                    record_last_updated = now()
+                -- Unchanged pages are not rewritten
+                WHERE (au_domain_metadata.title, au_domain_metadata.description, au_domain_metadata.keywords,
+                       au_domain_metadata.og_title, au_domain_metadata.og_description,
+                       au_domain_metadata.og_site_name, au_domain_metadata.twitter_title,
+                       au_domain_metadata.twitter_description, au_domain_metadata.canonical,
+                       au_domain_metadata.h1, au_domain_metadata.language)
+                    IS DISTINCT FROM
+                      (EXCLUDED.title, EXCLUDED.description, EXCLUDED.keywords, EXCLUDED.og_title,
+                       EXCLUDED.og_description, EXCLUDED.og_site_name, EXCLUDED.twitter_title,
+                       EXCLUDED.twitter_description, EXCLUDED.canonical, EXCLUDED.h1, EXCLUDED.language)
+            """, metadata_tuples)
+
+        if social_tuples:
+            execute_values(cur, """
+                INSERT INTO au_entity_social_links(domain_id, platform, url, record_last_updated)
+                VALUES %s
+                ON CONFLICT (domain_id, platform) DO UPDATE SET
+                    url = EXCLUDED.url,
+                    record_last_updated = now()
+            """, social_tuples)
 
 # -------------------------
 # 3️⃣ Load scored_links -> associate domains with trading names / ABNs
 # -------------------------
-for chunk in read_csv_s3(S3_BUCKET, SCORED_KEY):
-    # Ensure domains exist
-    for domain in chunk["domain"].unique():
+def load_scored_links(cur, chunks):
+    """
+    COPY each chunk of domain_match output into a session temp table once,
+    then apply it with two set-based statements: upsert the domains with
+    their match score, and touch the metadata rows of the matched URLs.
+    """
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS stage_scored_links (
+            domain TEXT,
+            abn BIGINT,
+            url TEXT,
+            score REAL
+        )
+    """)
+
+    for chunk in chunks:
+        # Unmatched domains have no ABN
+        chunk = chunk.dropna(subset=["abn"]).astype({"abn": "int64"})
+        cur.execute("TRUNCATE stage_scored_links")
+        copy_frame(cur, chunk, "stage_scored_links")
+
+        # Ensure domains exist; the score is only kept for the ABN the domain is linked to
         cur.execute("""
-            INSERT INTO au_entity_domains(domain, abn, record_last_updated)
-            VALUES (%s, %s, now())
-            ON CONFLICT (domain) DO NOTHING
-        """, (domain, int(chunk[chunk["domain"]==domain]["abn"].iloc[0])))
-
-    # Map domain -> domain_id
-    cur.execute("SELECT id, domain FROM au_entity_domains")
-    domain_map = {row[1]: row[0] for row in cur.fetchall()}
-
-    # Optional: insert into domain metadata / scores table if needed
-    # For now we just update record_last_updated
-    for _, row in chunk.iterrows():
-        domain_id = domain_map[row["domain"]]
+            INSERT INTO au_entity_domains(domain, abn, match_score, record_last_updated)
+            SELECT DISTINCT ON (domain) domain, abn, score, now()
+            FROM stage_scored_links
+            ORDER BY domain, score DESC NULLS LAST
+            ON CONFLICT (domain) DO UPDATE SET
+                match_score = EXCLUDED.match_score
+            WHERE au_entity_domains.abn = EXCLUDED.abn
+        """)
+
         cur.execute("""
-            UPDATE au_domain_metadata
+            UPDATE au_domain_metadata m
             SET record_last_updated = now()
-            WHERE domain_id = %s AND url = %s
-        """, (domain_id, row["url"]))
+            FROM stage_scored_links s
+            JOIN au_entity_domains d ON d.domain = s.domain
+            WHERE m.domain_id = d.id AND m.url = s.url
+        """)
+
+
+# -------------------------
+# Parallel, resumable chunk loading
+# -------------------------
+def ensure_progress_table(pool):
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} (
+                    source TEXT NOT NULL,
+                    chunk INTEGER NOT NULL,
+                    rows INTEGER NOT NULL,
+                    loaded_at TIMESTAMP DEFAULT now(),
+                    PRIMARY KEY (source, chunk)
+                )
+            """)
+        conn.commit()
+    finally:
+        pool.putconn(conn)
+
+
+def upgrade_tables(pool):
+    """Bring tables created by an older schema up to date (SCHEMA_UPGRADES)."""
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            for statement in SCHEMA_UPGRADES:
+                cur.execute(statement)
+        conn.commit()
+    finally:
+        pool.putconn(conn)
+
+
+def source_id(key):
+    """
+    Progress key of an S3 object. A new version of the object (ETag) or a
+    different CHUNK_SIZE numbers chunks differently, so it starts over.
+    """
+    etag = s3.head_object(Bucket=S3_BUCKET, Key=key)["ETag"].strip('"')
+    return f"{key}:{etag}:{CHUNK_SIZE}"
+
+
+def completed_chunks(pool, source):
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT chunk FROM {PROGRESS_TABLE} WHERE source = %s", (source,))
+            return {row[0] for row in cur.fetchall()}
+    finally:
+        conn.rollback()
+        pool.putconn(conn)
+
+
+def load_chunk(pool, source, chunk_num, chunk, loader, retries=MAX_RETRIES):
+    """
+    Load one chunk on a pooled connection and record it in PROGRESS_TABLE
+    in the same transaction, so a chunk is either loaded and recorded or
+    not at all. Deadlocks with other workers are retried with backoff.
+    """
+    conn = pool.getconn()
+    try:
+        for attempt in range(retries + 1):
+            try:
+                with conn.cursor() as cur:
+                    loader(cur, [chunk])
+                    cur.execute(
+                        f"INSERT INTO {PROGRESS_TABLE}(source, chunk, rows) VALUES (%s, %s, %s)",
+                        (source, chunk_num, len(chunk))
+                    )
+                conn.commit()
+                return len(chunk)
+            except (errors.DeadlockDetected, errors.SerializationFailure):
+                conn.rollback()
+                if attempt == retries:
+                    raise
+                time.sleep(2 ** attempt)
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
+
+
+def load_table_parallel(pool, key, loader, read_kwargs, workers=LOAD_WORKERS):
+    """
+    Stream key from S3 in CHUNK_SIZE chunks and load them with up to
+    `workers` connections, committing each chunk on its own. Chunks already
+    in PROGRESS_TABLE are skipped. At most two chunks per worker are held
+    in memory. Returns the failed chunk numbers.
+    """
+    source = source_id(key)
+    done = completed_chunks(pool, source)
+    if done:
+        print(f"{key}: {len(done)} chunks already loaded, resuming")
+
+    failed = []
+    pending = {}
+
+    def collect(finished):
+        for future in finished:
+            chunk_num = pending.pop(future)
+            try:
+                rows = future.result()
+            except Exception as e:
+                print(f"{key}: chunk {chunk_num} failed: {e}")
+                failed.append(chunk_num)
+                continue
+            print(f"{key}: chunk {chunk_num} loaded ({rows} rows)")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk_num, chunk in enumerate(read_table_s3(S3_BUCKET, key, **read_kwargs)):
+            if chunk_num in done:
+                continue
+            if len(pending) >= 2 * workers:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+            future = executor.submit(load_chunk, pool, source, chunk_num, chunk, loader)
+            pending[future] = chunk_num
+        collect(wait(pending).done)
+
+    return sorted(failed)
+
+
+# -------------------------
+# Bulk load: build indexes after the data is in
+# -------------------------
+def schema_statements(table):
+    """The statements of a table's schema file, comments removed."""
+    with open(os.path.join(SCHEMA_DIR, SCHEMA_FILES[table]), encoding="utf-8") as f:
+        sql = "".join(line.split("--")[0] + "\n" for line in f)
+    return [statement.strip() for statement in sql.split(";") if statement.strip()]
+
+
+def is_deferred(statement):
+    """
+    Secondary indexes and CLUSTER wait until after a bulk load. Tables,
+    extensions and unique indexes (the upserts' ON CONFLICT targets) are
+    created up front.
+    """
+    return statement.upper().startswith(("CREATE INDEX", "CLUSTER"))
+
+
+def bulk_load_in_progress(pool):
+    """True while a bulk load has created its tables but not finished its indexes."""
+    return bool(completed_chunks(pool, BULK_LOAD_MARKER))
+
+
+def create_fresh_tables(pool):
+    """
+    Drop the target tables and recreate them without their deferred
+    statements. Progress of earlier loads is cleared (their chunks went with
+    the old tables) and BULK_LOAD_MARKER is set, all in one transaction.
+    """
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            for table in reversed(list(SCHEMA_FILES)):
+                cur.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
+            for table in SCHEMA_FILES:
+                for statement in schema_statements(table):
+                    if not is_deferred(statement):
+                        cur.execute(statement)
+            cur.execute(f"DELETE FROM {PROGRESS_TABLE}")
+            cur.execute(
+                f"INSERT INTO {PROGRESS_TABLE}(source, chunk, rows) VALUES (%s, 0, 0)", (BULK_LOAD_MARKER,)
+            )
+        conn.commit()
+    finally:
+        pool.putconn(conn)
+
+
+def finish_bulk_load(pool):
+    """Clear BULK_LOAD_MARKER once the deferred indexes are built."""
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DELETE FROM {PROGRESS_TABLE} WHERE source = %s", (BULK_LOAD_MARKER,))
+        conn.commit()
+    finally:
+        pool.putconn(conn)
+
+
+def build_table_indexes(pool, table):
+    """
+    Run a table's deferred statements. The index CLUSTER uses is built
+    first, since CLUSTER rewrites the table and would rebuild any index
+    created before it.
+    """
+    statements = [st for st in schema_statements(table) if is_deferred(st)]
+    cluster = [st for st in statements if st.upper().startswith("CLUSTER")]
+    cluster_indexes = {st.split()[-1] for st in cluster}
+    first = [st for st in statements if not st.upper().startswith("CLUSTER") and st.split()[2] in cluster_indexes]
+    rest = [st for st in statements if st not in cluster and st not in first]
+
+    conn = pool.getconn()
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"SET maintenance_work_mem = '{INDEX_MEMORY}'")
+            for statement in first + cluster + rest + [f"ANALYZE {table}"]:
+                # Idempotent, so a rerun after a failed build picks up where it stopped
+                statement = re.sub(r"^CREATE INDEX (?!IF NOT EXISTS)", "CREATE INDEX IF NOT EXISTS ", statement, flags=re.I)
+                start = time.perf_counter()
+                cur.execute(statement)
+                print(f"{table}: {statement.split(' ON ')[0]} ({time.perf_counter() - start:.1f}s)")
+    finally:
+        conn.autocommit = False
+        pool.putconn(conn)
+
+
+def build_deferred_indexes(pool, workers=LOAD_WORKERS):
+    """Build every table's deferred indexes, one table per connection in parallel."""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(build_table_indexes, pool, table) for table in SCHEMA_FILES]:
+            future.result()
+
+
+def main():
+    if INCREMENTAL and BULK_LOAD:
+        # A bulk load recreates every table, then an incremental run would load only the deltas
+        raise ValueError("INCREMENTAL and BULK_LOAD cannot both be set")
+
+    pool = ThreadedConnectionPool(1, LOAD_WORKERS, **DB_CONFIG)
+    ensure_progress_table(pool)
+    upgrade_tables(pool)
+
+    if LOAD_MODE == "copy":
+        # Read CSV values as text; Postgres casts them, keeping leading zeros in postcodes
+        entities = (load_entities_copy, {"dtype": str})
+    else:
+        entities = (load_entities_values, {})
+
+    # FK order: au_entities before au_entity_domains, whose ids metadata,
+    # social links and scores reference. Chunks of one table load in parallel.
+    phases = [
+        (ENTITIES_DELTA_KEY if INCREMENTAL else ENTITIES_KEY, *entities),
+        (DOMAINS_DELTA_KEY if INCREMENTAL else DOMAINS_KEY, load_domains, {"columns": ["domain", "abn", "url", "meta"]}),
+        (SCORED_KEY, load_scored_links, {"columns": ["domain", "abn", "url", "score"]}),
+    ]
+
+    if BULK_LOAD:
+        # A rerun after a failed bulk load resumes into the tables it created
+        if bulk_load_in_progress(pool):
+            print("Resuming bulk load into existing tables")
+        else:
+            create_fresh_tables(pool)
+
+    for key, loader, read_kwargs in phases:
+        failed = load_table_parallel(pool, key, loader, read_kwargs)
+        if failed:
+            print(f"{key}: {len(failed)} chunks failed {failed}, rerun to resume; "
+                  "stopping before tables that reference it")
+            break
+    else:
+        if BULK_LOAD:
+            build_deferred_indexes(pool)
+            finish_bulk_load(pool)
+
+    pool.closeall()
+
 
-conn.commit()
-cur.close()
-conn.close()
+if __name__ == "__main__":
+    main()
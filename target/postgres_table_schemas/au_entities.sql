@@ -0,0 +1,19 @@
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE TABLE au_entities (
+    abn BIGINT PRIMARY KEY,
+    entity_name TEXT,
+    entity_type TEXT,
+    entity_type_code VARCHAR(10),
+    abn_status VARCHAR(10),
+    abn_status_from DATE,
+    asic_number BIGINT,
+    gst_status VARCHAR(10),
+    gst_from DATE,
+    state VARCHAR(10),
+    postcode VARCHAR(10),
+    record_last_updated TIMESTAMP DEFAULT now()
+);
+
+-- Optional: fuzzy search on entity names
+CREATE INDEX idx_entities_name_trgm ON au_entities USING gin (entity_name gin_trgm_ops);
@@ -1,5 +1,8 @@
-CREATE TABLE trading_names (
+CREATE TABLE au_entity_trading_names (
     id SERIAL PRIMARY KEY,
-    abn VARCHAR(20) NOT NULL REFERENCES au_entities(abn) ON DELETE CASCADE,
+    abn BIGINT NOT NULL REFERENCES au_entities(abn) ON DELETE CASCADE,
     trading_name TEXT NOT NULL
 );
+
+-- Prevent duplicate trading names per ABN (the loader upserts on this)
+CREATE UNIQUE INDEX idx_trading_names_abn_name ON au_entity_trading_names (abn, trading_name);
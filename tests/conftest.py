@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The pipeline stages are scripts that import their siblings directly,
+# so put each stage's directory on the path as running it would. au_abr is
+# left out: its extract.py would shadow the common_crawl one.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for stage in ["processing", os.path.join("raw_sources", "common_crawl")]:
+    sys.path.insert(0, os.path.join(ROOT, stage))
@@ -0,0 +1,104 @@
+import gzip
+import json
+import os
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from cc_index_local import host_to_surt, iter_parquet_index_records, iter_zipnum_index_records
+
+FIELDS = ["url", "timestamp", "status", "mime", "digest", "length", "offset", "filename"]
+
+# (host, path, fetch time, status, offset) in SURT order, as the CDX shards are sorted
+CAPTURES = [
+    ("cafe.com.au", "/", "20250316101500", 200, 100),
+    ("cafe.com.au", "/menu", "20250316101600", 200, 900),
+    ("example.com.au", "/", "20250317080000", 200, 1800),
+    ("example.com.au", "/about", "20250317080100", 404, 2700),
+    ("example.com.au", "/contact", "20250317080200", 200, 3600),
+    ("www.example.com.au", "/", "20250318120000", 301, 4500),
+    ("shop.co.nz", "/", "20250319000000", 200, 5400),
+]
+
+
+def capture_record(host, path, timestamp, status, offset):
+    return {
+        "url": f"https://{host}{path}",
+        "timestamp": timestamp,
+        "status": str(status),
+        "mime": "text/html",
+        "digest": f"SHA1{offset}",
+        "length": "800",
+        "offset": str(offset),
+        "filename": "crawl-data/CC-MAIN-2025-13/segments/1/warc/00000.warc.gz",
+    }
+
+
+@pytest.fixture
+def zipnum_dir(tmp_path):
+    """cdx-00000.gz as three gzip blocks of CDX lines, indexed by cluster.idx."""
+    lines = []
+    for host, path, timestamp, status, offset in CAPTURES:
+        rec = capture_record(host, path, timestamp, status, offset)
+        payload = {k: v for k, v in rec.items() if k != "timestamp"}
+        lines.append(f"{host_to_surt(host)}){path} {timestamp} {json.dumps(payload)}")
+    lines.sort()
+
+    cluster, data = [], b""
+    # example.com.au spans the first two blocks, so the block before the bisect point matters
+    for block in [lines[0:3], lines[3:5], lines[5:]]:
+        member = gzip.compress(("\n".join(block) + "\n").encode("utf-8"))
+        key = " ".join(block[0].split(" ", 2)[:2])
+        cluster.append(f"{key}\tcdx-00000.gz\t{len(data)}\t{len(member)}\t{len(cluster) + 1}")
+        data += member
+
+    (tmp_path / "cdx-00000.gz").write_bytes(data)
+    (tmp_path / "cluster.idx").write_text("\n".join(cluster) + "\n", encoding="utf-8")
+    return str(tmp_path)
+
+
+@pytest.fixture
+def parquet_dir(tmp_path):
+    """One Parquet file with the cc-index columns the reader selects."""
+    recs = [capture_record(*capture) for capture in CAPTURES]
+    table = pa.table({
+        "url_host_name": [capture[0] for capture in CAPTURES],
+        "url_host_tld": [capture[0].rsplit(".", 1)[1] for capture in CAPTURES],
+        "url": [r["url"] for r in recs],
+        "fetch_time": pa.array([datetime.strptime(r["timestamp"], "%Y%m%d%H%M%S") for r in recs], pa.timestamp("ms")),
+        "fetch_status": pa.array([int(r["status"]) for r in recs], pa.int16()),
+        "content_mime_type": [r["mime"] for r in recs],
+        "content_digest": [r["digest"] for r in recs],
+        "warc_record_length": pa.array([int(r["length"]) for r in recs], pa.int32()),
+        "warc_record_offset": pa.array([int(r["offset"]) for r in recs], pa.int32()),
+        "warc_filename": [r["filename"] for r in recs],
+    })
+    path = tmp_path / "subset=warc"
+    os.makedirs(path)
+    pq.write_table(table, path / "part-00000.parquet")
+    return str(path)
+
+
+def as_rows(records):
+    """Compare on the shared CDX fields, as strings (how save_index_pages writes them)."""
+    return sorted(tuple(str(rec[field]) for field in FIELDS) for rec in records)
+
+
+def parquet_rows(index_dir, **kwargs):
+    return as_rows(rec for df in iter_parquet_index_records(index_dir, **kwargs) for rec in df.to_dict("records"))
+
+
+@pytest.mark.parametrize("hosts", [["example.com.au"], ["cafe.com.au", "www.example.com.au"]])
+def test_host_filter_matches_across_readers(zipnum_dir, parquet_dir, hosts):
+    zipnum = as_rows(iter_zipnum_index_records(zipnum_dir, hosts=hosts))
+    expected = as_rows(capture_record(*c) for c in CAPTURES if c[0] in hosts)
+    assert zipnum == expected
+    assert parquet_rows(parquet_dir, hosts=hosts) == expected
+
+
+def test_tld_filter_matches_across_readers(zipnum_dir, parquet_dir):
+    zipnum = as_rows(iter_zipnum_index_records(zipnum_dir, tld="au"))
+    assert len(zipnum) == 6
+    assert parquet_rows(parquet_dir, tld="au") == zipnum
@@ -0,0 +1,107 @@
+import asyncio
+from io import BytesIO
+
+import aiohttp
+import pytest
+from aiohttp import web
+from warcio.statusandheaders import StatusAndHeaders
+from warcio.warcwriter import WARCWriter
+
+import common_crawl_process as ccp
+
+
+def test_failed_range_fetch_yields_no_records(monkeypatch):
+    def fail(*args, **kwargs):
+        raise ConnectionError("reset by peer")
+
+    monkeypatch.setattr(ccp, "fetch_warc_record", fail)
+    plan = ccp.RangeFetch("crawl/warc.gz", 100, 300, [{"filename": "crawl/warc.gz", "offset": 100, "length": 200}])
+    # Nothing reaches the writer, so the record is not checkpointed and is retried next run
+    assert ccp.fetch_range_payloads(plan) == []
+
+
+def warc_response(body, content_type):
+    out = BytesIO()
+    writer = WARCWriter(out, gzip=True)
+    headers = StatusAndHeaders("200 OK", [("Content-Type", content_type)], protocol="HTTP/1.1")
+    writer.write_record(writer.create_warc_record("http://cafe.com.au/", "response",
+                                                  payload=BytesIO(body), http_headers=headers))
+    return out.getvalue()
+
+
+PAGE = """<html lang="de"><head><title>Café Müller</title>
+<meta name="description" content="Kaffee & Kuchen – seit 1952"></head>
+<body><h1>Willkommen im Café Müller</h1></body></html>"""
+
+
+def extract_both(payload):
+    return {name: ccp.extract_warc_metadata(BytesIO(payload), extractor=name) for name in ccp.HTML_EXTRACTORS}
+
+
+def test_fast_and_bs4_agree_on_header_charset():
+    results = extract_both(warc_response(PAGE.encode("windows-1252"), "text/html; charset=windows-1252"))
+    assert results["fast"] == results["bs4"]
+    assert results["fast"]["title"] == "Café Müller"
+    assert results["fast"]["description"] == "Kaffee & Kuchen – seit 1952"
+
+
+def test_fast_and_bs4_agree_on_meta_charset():
+    page = PAGE.replace("<head>", '<head><meta charset="windows-1252">')
+    results = extract_both(warc_response(page.encode("windows-1252"), "text/html"))
+    assert results["fast"] == results["bs4"]
+    assert results["fast"]["h1"] == "Willkommen im Café Müller"
+
+
+def test_async_fetch_rejects_response_that_ignored_range(monkeypatch):
+    body = bytes(range(256)) * 4
+
+    async def handler(request):
+        if request.path.startswith("/full"):
+            return web.Response(body=body)
+        start, end = map(int, request.headers["Range"].split("=")[1].split("-"))
+        return web.Response(status=206, body=body[start:end + 1])
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/{name}", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        monkeypatch.setattr(ccp, "CC_DATA_BASE", f"http://127.0.0.1:{port}")
+        try:
+            async with aiohttp.ClientSession() as session:
+                assert await ccp.fetch_warc_record_async(session, "part.warc.gz", 10, 5) == body[10:15]
+                with pytest.raises(ValueError, match="206"):
+                    await ccp.fetch_warc_record_async(session, "full.warc.gz", 10, 5)
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+
+def result_row(offset):
+    return {"domain": "cafe.com.au", "url": f"https://cafe.com.au/{offset}", "status": 200, "mime": "text/html",
+            "length": 500, "filename": "crawl/00000.warc.gz", "offset": offset, "digest": f"SHA1{offset}",
+            "meta": dict.fromkeys(ccp.META_FIELDS)}
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "csv"])
+def test_checkpoint_is_rebuilt_from_published_shards(tmp_path, fmt):
+    writer = ccp.ShardedResultWriter(str(tmp_path), fmt=fmt, rows_per_shard=2)
+    for offset in range(0, 500, 100):
+        writer.write(result_row(offset))
+    # A crash now loses the one buffered row; a half-written shard is never published
+    (tmp_path / f".part-00002.{fmt}").write_text("partial")
+    assert ccp.load_checkpoint(str(tmp_path)) == {("crawl/00000.warc.gz", offset) for offset in range(0, 400, 100)}
+
+    writer.close()
+    assert len(ccp.load_checkpoint(str(tmp_path))) == 5
+
+
+@pytest.mark.parametrize("title", ["A <b>B</b>", "<b>B</b>", "a &lt;b&gt; c", "<!-- x -->A", "Tom &amp; Jerry", ""])
+def test_fast_and_bs4_agree_on_title_markup(title):
+    page = f"<html><head><title>{title}</title></head><body><h1>Hi</h1></body></html>"
+    results = extract_both(warc_response(page.encode("utf-8"), "text/html; charset=utf-8"))
+    assert results["fast"] == results["bs4"]
@@ -0,0 +1,63 @@
+import pandas as pd
+
+from domain_match import TOP_K, NgramIndex, WordSegmenter, explode_names, match_candidate, read_table, root_matches
+
+NAMES = [
+    "smith plumbing",
+    "j r jones",
+    "plumbing supplies",
+    "bunnings group",
+    "b u n n i n g s",
+    "t e l s t r a corporation",
+]
+
+
+def test_segmenter_splits_covered_root():
+    assert WordSegmenter(NAMES).split("smithplumbing") == "smith plumbing"
+
+
+def test_segmenter_keeps_out_of_vocabulary_root_whole():
+    segmenter = WordSegmenter(NAMES)
+    # Single letters are in the names but must not shred unknown roots
+    assert segmenter.split("telstra") == "telstra"
+    assert segmenter.split("bunningsxyz") == "bunningsxyz"
+    assert segmenter.split("") == ""
+
+
+def test_segmenter_keeps_known_root_whole():
+    assert WordSegmenter(NAMES).split("bunnings") == "bunnings"
+
+
+def test_exact_name_survives_more_than_top_k_longer_ties():
+    # Every long name shares all of the query's trigrams, so a raw count ties them
+    names = [f"smith plumbing and gas services {i}" for i in range(10 * TOP_K)]
+    names.insert(5 * TOP_K, "smith plumbing")
+    index = NgramIndex(names)
+    positions, score = match_candidate("smith plumbing", names, index)
+    assert list(positions) == [5 * TOP_K]
+    assert score == 100
+
+
+def test_entity_name_hit_beats_earlier_trading_name_hit():
+    abr = pd.DataFrame({
+        "ABN": [11111111111, 22222222222],
+        "Entity_Name": ["JONES HOLDINGS PTY LTD", "SMITH PLUMBING PTY LTD"],
+        "Trading_Names": ["Smith Plumbing", None],
+        "Entity_Name_norm": ["jones holdings", "smith plumbing"],
+        "Trading_Names_norm": ["smith plumbing", None],
+    })
+    match = root_matches(["smithplumbing"], ["smith plumbing"], explode_names(abr), abr).iloc[0]
+    assert match["abn"] == 22222222222
+    assert match["name_type"] == "entity"
+    assert match["tie_count"] == 2
+    assert match["tied_abns"] == "11111111111; 22222222222"
+
+
+def test_read_table_reads_a_directory_of_csv_shards(tmp_path):
+    for i in range(3):
+        pd.DataFrame({"domain": [f"d{i}.com.au"], "url": [f"https://d{i}.com.au/"], "status": [200]}).to_csv(
+            tmp_path / f"part-{i:05d}.csv", index=False
+        )
+    df = read_table(str(tmp_path), ["domain", "url"])
+    assert list(df.columns) == ["domain", "url"]
+    assert list(df["domain"]) == ["d0.com.au", "d1.com.au", "d2.com.au"]
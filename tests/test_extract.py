@@ -0,0 +1,24 @@
+from extract import load_manifest, manifest_key, save_manifest
+
+
+def test_manifest_resumes_same_query(tmp_path):
+    key = manifest_key("*.au/", 10)
+    save_manifest(tmp_path, key, {0, 1, 2})
+    assert load_manifest(tmp_path, key) == {0, 1, 2}
+
+
+def test_manifest_for_another_query_is_reset(tmp_path):
+    save_manifest(tmp_path, manifest_key("*.au/", 10), {0, 1})
+    for page in [1, 2]:
+        (tmp_path / f"page_{page}.jsonl").write_text("{}\n")
+
+    for key in [manifest_key("*.nz/", 10), manifest_key("*.au/", 12)]:
+        assert load_manifest(tmp_path, key) == set()
+        # Pages of the other query are gone, so the output can't mix crawls
+        assert not list(tmp_path.glob("page_*.jsonl"))
+        save_manifest(tmp_path, manifest_key("*.au/", 10), {0, 1})
+
+
+def test_manifest_without_query_fields_is_reset(tmp_path):
+    (tmp_path / "_manifest.json").write_text('{"completed_pages": [0, 1]}')
+    assert load_manifest(tmp_path, manifest_key("*.au/", 10)) == set()